@@ -1,24 +1,86 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from enum import Enum
+import io
+import json
+import os
+import queue
 import threading
+import time
 from typing import Annotated
 
 import torch
 import torchaudio
-from fastapi import FastAPI, File, UploadFile, Form
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
-from ichigo.asr import get_model
+from ichigo.asr import model_registry
+from ichigo.asr.config import available_configs
+from ichigo.asr.snapshot import load_snapshot
+from ichigo.asr.tokens import stoks_to_str, str_to_stoks
 
 
-MODEL_LOCK = threading.Lock()
+# model name -> IchigoASR kwargs. "ichigo" is kept as an alias of the default config
+MODELS = {"ichigo": dict(), **{name: dict(config=name) for name in available_configs()}}
+if os.environ.get("ICHIGO_SNAPSHOT"):  # see ichigo.asr.snapshot
+    # served under "ichigo" and the name of its config, so both share one copy
+    snapshot = os.environ["ICHIGO_SNAPSHOT"]
+    MODELS["ichigo"] = MODELS[load_snapshot(snapshot)["config_name"]] = dict(
+        snapshot=snapshot
+    )
+if os.environ.get("ICHIGO_VAD", "0") == "1":
+    MODELS = {name: dict(kwargs, vad=True) for name, kwargs in MODELS.items()}
+TranscriptionsModelName = Enum(
+    "TranscriptionsModelName", {name: name for name in MODELS}, type=str
+)
+
+if "ICHIGO_MEMORY_BUDGET_GB" in os.environ:
+    budget_gb = float(os.environ["ICHIGO_MEMORY_BUDGET_GB"])
+    model_registry.memory_budget = int(budget_gb * 1e9)
+
+# Limits
+MAX_UPLOAD_BYTES = int(float(os.environ.get("ICHIGO_MAX_UPLOAD_MB", 25)) * 1e6)
+# whole request body, leaving room for the multipart headers and form fields
+MAX_BODY_BYTES = MAX_UPLOAD_BYTES + 2**20
+MAX_AUDIO_SECONDS = float(os.environ.get("ICHIGO_MAX_AUDIO_SECONDS", 600))
+REQUEST_TIMEOUT = float(os.environ.get("ICHIGO_REQUEST_TIMEOUT", 60))
+# requests queued or running at once, beyond which new ones get 503
+MAX_PENDING = int(os.environ.get("ICHIGO_MAX_PENDING", 32))
+
+PENDING_SLOTS = threading.BoundedSemaphore(MAX_PENDING)
+EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("ICHIGO_WORKERS", 4)),
+    thread_name_prefix="ichigo-inference",
+)
+
+# one lock per loaded model, so different models can run side by side
+_MODEL_LOCKS = {}
+_MODEL_LOCKS_LOCK = threading.Lock()
+
+
+def model_lock(model) -> threading.Lock:
+    with _MODEL_LOCKS_LOCK:
+        return _MODEL_LOCKS.setdefault(id(model), threading.Lock())
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # load model to GPU at startup
-    get_model()
+    # load default model to GPU at startup, other models in the background
+    model = model_registry.get(**MODELS["ichigo"])
+    model.warmup()
+    timings = model.startup_timings
+    print(
+        f"Ichigo ASR ready in {timings['ready']:.1f}s "
+        f"(load {timings['load']:.1f}s, warm-up {timings['warmup']:.1f}s)"
+    )
+    for name in os.environ.get("ICHIGO_PRELOAD_MODELS", "").split(","):
+        if name.strip():
+            model_registry.warmup(**MODELS[name.strip()])
     yield
+    EXECUTOR.shutdown(wait=False, cancel_futures=True)
 
 
 app = FastAPI(
@@ -29,74 +91,267 @@ app = FastAPI(
 )
 
 
-class TranscriptionsModelName(str, Enum):
-    ichigo = "ichigo"
+class BodySizeLimit:
+    """Answer 413 to request bodies over `max_bytes` before they are parsed.
+
+    Checks Content-Length upfront and counts the bytes of chunked bodies as
+    they arrive, so oversized uploads are never spooled to memory or disk.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        too_large = HTTPException(413, f"Request body larger than {self.max_bytes} bytes")
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            response = JSONResponse({"detail": too_large.detail}, too_large.status_code)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise too_large
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(BodySizeLimit, max_bytes=MAX_BODY_BYTES)
+
+
+def decode_audio(data: bytes):
+    buffer = io.BytesIO(data)
+    try:
+        info = torchaudio.info(buffer)
+        # some decoders cannot tell the length without decoding (num_frames == 0)
+        if info.num_frames / info.sample_rate > MAX_AUDIO_SECONDS:
+            raise HTTPException(413, f"Audio longer than {MAX_AUDIO_SECONDS}s")
+        buffer.seek(0)
+        wav, sr = torchaudio.load(buffer)
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(400, "Could not decode audio file")
+
+    if wav.shape[1] / sr > MAX_AUDIO_SECONDS:
+        raise HTTPException(413, f"Audio longer than {MAX_AUDIO_SECONDS}s")
+    if wav.shape[0] > 1:  # convert multi-channel audio to mono
+        wav = wav.mean(0, keepdim=True)
+    return wav, sr
+
+
+def sse_event(**data) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def read_audio(file: UploadFile):
+    """Read the upload within the size limit and decode it off the event loop"""
+    data = await file.read(MAX_UPLOAD_BYTES + 1)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(413, f"Upload larger than {MAX_UPLOAD_BYTES} bytes")
+    return await run_in_threadpool(decode_audio, data)
+
+
+class Job:
+    """`fn(model)` queued on an inference thread, run while holding the model's lock.
+
+    Raises 503 when too many requests are pending. Work that has not started
+    yet is dropped once the job is cancelled or its deadline passes.
+    """
+
+    def __init__(self, model_name: str, fn):
+        if not PENDING_SLOTS.acquire(blocking=False):
+            raise HTTPException(503, "Server overloaded", headers={"Retry-After": "1"})
+
+        self.deadline = time.monotonic() + REQUEST_TIMEOUT
+        self.cancelled = threading.Event()
+        try:
+            self.future = EXECUTOR.submit(self._work, model_name, fn)
+        except RuntimeError:  # executor shut down
+            PENDING_SLOTS.release()
+            raise HTTPException(503, "Server shutting down")
+
+    def _work(self, model_name, fn):
+        try:
+            with model_registry.use(**MODELS[model_name]) as model, model_lock(model):
+                if self.expired():
+                    raise TimeoutError
+                with torch.no_grad():
+                    return fn(model)
+        finally:
+            PENDING_SLOTS.release()
+
+    def expired(self) -> bool:
+        return self.cancelled.is_set() or time.monotonic() > self.deadline
+
+    def cancel(self):
+        if not self.future.done():
+            self.cancelled.set()
+            if self.future.cancel():  # never started, so `_work` will not release its slot
+                PENDING_SLOTS.release()
+
+
+async def run_model(request: Request, model_name: str, fn):
+    """Run `fn(model)` as a `Job`, giving up with 504 past the request deadline
+    and cancelling it when the client disconnects."""
+    job = Job(model_name, fn)
+    task = asyncio.wrap_future(job.future)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=0.1)
+            if done:
+                try:
+                    return task.result()
+                except TimeoutError:
+                    raise HTTPException(504, "Request deadline exceeded")
+            if await request.is_disconnected():
+                raise HTTPException(499, "Client closed request")
+            if time.monotonic() > job.deadline:
+                raise HTTPException(504, "Request deadline exceeded")
+    finally:
+        job.cancel()
+
+
+def stream_model(request: Request, model_name: str, fn):
+    """Like `run_model`, but `fn(model)` returns an iterator and this returns an
+    async iterator over its items, yielded as soon as the inference thread
+    produces them.
+
+    The job is queued right away, so overload is reported before a response
+    starts. The stream stops early when the client disconnects, and raises
+    TimeoutError past the request deadline.
+    """
+    items = queue.SimpleQueue()
+    stop = threading.Event()
+
+    def produce(model):
+        iterator = fn(model)
+        try:
+            for item in iterator:
+                items.put(item)
+                if stop.is_set():
+                    break
+        finally:
+            iterator.close()
+
+    job = Job(model_name, produce)
+
+    async def consume():
+        try:
+            while True:
+                finished = job.future.done()  # items are put before it is set
+                while not items.empty():
+                    yield items.get()
+                if finished:
+                    job.future.result()
+                    return
+
+                await asyncio.sleep(0.02)
+                if await request.is_disconnected():
+                    return
+                if time.monotonic() > job.deadline:
+                    raise TimeoutError
+        finally:
+            stop.set()
+            job.cancel()
+
+    return consume()
 
 
 @app.post("/v1/audio/transcriptions")
-def _(
+async def _(
+    request: Request,
     file: Annotated[UploadFile, File()],
     model: Annotated[TranscriptionsModelName, Form()],
+    stream: Annotated[bool, Form()] = False,
 ):
     """
     Transcribe an audio file uploaded via HTTP POST request
 
     Args:
         file: Audio file to transcribe
+        model: Name of the model to use
+        stream: Send the transcript as server-sent events while it is decoded:
+            `transcript.text.delta` events followed by one `transcript.text.done`
     """
-    wav, sr = torchaudio.load(file.file)
-    if wav.shape[0] > 1:  # convert multi-channel audio to mono
-        wav = wav.mean(0, keepdim=True)
+    wav, sr = await read_audio(file)
+
+    if stream:
+
+        def transcribe_stream(model_):
+            return model_.infer_stream(model_.preprocess(wav, sr))
+
+        deltas = stream_model(request, model.value, transcribe_stream)
+
+        async def events():
+            text = ""
+            try:
+                async for delta in deltas:
+                    text += delta
+                    yield sse_event(type="transcript.text.delta", delta=delta)
+            except TimeoutError:
+                message = "Request deadline exceeded"
+                yield sse_event(type="error", error=dict(message=message))
+                return
+            except Exception as e:
+                yield sse_event(type="error", error=dict(message=str(e)))
+                return
+            yield sse_event(type="transcript.text.done", text=text)
 
-    model_ = get_model()
-    MODEL_LOCK.acquire()
-    wav = model_.preprocess(wav, sr)
+        return StreamingResponse(events(), media_type="text/event-stream")
 
-    with torch.no_grad():
-        embs, n_frames = model_.s2r(wav)
-        dequantize_embed = model_.quantizer(embs, n_frames)
-        output = model_.r2t(dequantize_embed)[0].text
-    MODEL_LOCK.release()
+    def transcribe(model_):
+        return model_.infer(model_.preprocess(wav, sr))
 
+    output = await run_model(request, model.value, transcribe)
     return dict(text=output)
 
 
 @app.post("/s2r")
-def _(file: UploadFile = File(...)):
-    wav, sr = torchaudio.load(file.file)
-    if wav.shape[0] > 1:  # convert multi-channel audio to mono
-        wav = wav.mean(0, keepdim=True)
-
-    model = get_model()
-    MODEL_LOCK.acquire()
-    with torch.no_grad():
-        wav = model.preprocess(wav, sr)
-        embs, n_frames = model.s2r(wav)
-        token_ids = model.quantizer.quantize(embs, n_frames).squeeze(0).tolist()
-    MODEL_LOCK.release()
+async def _(
+    request: Request,
+    file: UploadFile = File(...),
+    model: Annotated[TranscriptionsModelName, Form()] = TranscriptionsModelName.ichigo,
+    compress: Annotated[bool, Form()] = False,
+):
+    """compress=true run-length encodes repeated tokens as <|sound_XXXX|><|sound_dur_N|>"""
+    wav, sr = await read_audio(file)
 
-    output = "".join(f"<|sound_{tok:04d}|>" for tok in token_ids)
-    output = f"<|sound_start|>{output}<|sound_end|>"
+    def tokenize(model_):
+        wav_ = model_.preprocess(wav, sr)
+        token_ids = model_.encode_stoks(wav_, compress=compress).squeeze(0).tolist()
+        dur_base = model_.quantizer.codebook_size if compress else None
+        return stoks_to_str(token_ids, dur_base)
 
+    output = await run_model(request, model.value, tokenize)
     return dict(tokens=output)
 
 
 class R2TRequest(BaseModel):
     tokens: str
+    model: TranscriptionsModelName = TranscriptionsModelName.ichigo
 
 
 @app.post("/r2t")
-def _(req: R2TRequest):
-    """tokens will have format <|sound_start|><|sound_0000|><|sound_end|>"""
-    token_ids = [int(x) for x in req.tokens.split("|><|sound_")[1:-1]]
-    token_ids = torch.tensor(token_ids).unsqueeze(0)
-
-    model = get_model()
-    MODEL_LOCK.acquire()
-    with torch.no_grad():
-        token_ids = token_ids.to(model.device)
-        embeds = model.quantizer.dequantize(token_ids)
-        output = model.r2t(embeds)[0].text
-    MODEL_LOCK.release()
+async def _(request: Request, req: R2TRequest):
+    """tokens will have format <|sound_start|><|sound_0000|><|sound_end|>
+
+    Run-length duration tokens <|sound_dur_N|> from /s2r with compress=true are expanded
+    """
+
+    def detokenize(model):
+        token_ids = str_to_stoks(req.tokens, dur_base=model.quantizer.codebook_size)
+        return model.decode_stoks(torch.tensor(token_ids).unsqueeze(0))
 
+    output = await run_model(request, req.model.value, detokenize)
     return dict(text=output)
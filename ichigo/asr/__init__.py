@@ -2,16 +2,15 @@ from typing import Union
 
 import torch
 
+from ichigo.asr.registry import ModelRegistry
 from ichigo.asr.transcriber import IchigoASR
 
-_default_model = None
+model_registry = ModelRegistry()
+
 
 def get_model(**kwargs) -> IchigoASR:
-    """Get or create default ASR model instance"""
-    global _default_model
-    if _default_model is None:
-        _default_model = IchigoASR(**kwargs)
-    return _default_model
+    """Get or create the ASR model instance for the given config and device"""
+    return model_registry.get(**kwargs)
 
 
 def transcribe(
@@ -1,5 +1,6 @@
 from .s2r import Speech2Rep
 from .quantizer import Quantizer
 from .r2t import Rep2Text
+from .workspace import Workspace
 
-__all__ = ["Speech2Rep", "Quantizer", "Rep2Text"]
+__all__ = ["Speech2Rep", "Quantizer", "Rep2Text", "Workspace"]
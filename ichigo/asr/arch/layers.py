@@ -3,9 +3,51 @@ from typing import Optional
 
 import torch
 import torch.nn.functional as F
+import whisper
 from torch import Tensor, nn
 
 
+def empty_whisper(
+    dims: whisper.model.ModelDimensions, encoder: bool = True, decoder: bool = True
+) -> whisper.model.Whisper:
+    """
+    Whisper with its parameters and persistent buffers on the meta device, to be
+    filled with `load_state_dict(..., assign=True)`. Nothing is allocated or
+    randomly initialized.
+
+    Mirrors `Whisper.__init__`, whose sparse alignment_heads buffer cannot be
+    built on meta. The encoder or decoder can be left out.
+    """
+    model = whisper.model.Whisper.__new__(whisper.model.Whisper)
+    nn.Module.__init__(model)
+    model.dims = dims
+    with torch.device("meta"):
+        if encoder:
+            model.encoder = whisper.model.AudioEncoder(
+                dims.n_mels,
+                dims.n_audio_ctx,
+                dims.n_audio_state,
+                dims.n_audio_head,
+                dims.n_audio_layer,
+            )
+        if decoder:
+            model.decoder = whisper.model.TextDecoder(
+                dims.n_vocab,
+                dims.n_text_ctx,
+                dims.n_text_state,
+                dims.n_text_head,
+                dims.n_text_layer,
+            )
+    if decoder:  # not in the state dict
+        mask = torch.full((dims.n_text_ctx, dims.n_text_ctx), -math.inf).triu_(1)
+        model.decoder.register_buffer("mask", mask, persistent=False)
+
+    all_heads = torch.zeros(dims.n_text_layer, dims.n_text_head, dtype=torch.bool)
+    all_heads[dims.n_text_layer // 2 :] = True
+    model.register_buffer("alignment_heads", all_heads.to_sparse(), persistent=False)
+    return model
+
+
 class LayerNorm(nn.LayerNorm):
     def forward(self, x):
         return super().forward(x.float()).type(x.dtype)
@@ -6,6 +6,7 @@ import torch.nn.functional as F
 from vector_quantize_pytorch import ResidualVQ
 
 from ichigo.asr.arch.layers import LayerNorm, ResidualAttentionBlock
+from ichigo.asr.tokens import rle_compress, rle_expand
 
 
 class Quantizer(nn.Module):
@@ -38,9 +39,16 @@ class Quantizer(nn.Module):
         self.downsample_conv = qconfig["downsample_conv"]
         self.downsample_mean = qconfig["downsample_mean"]
 
+        # Ids >= codebook_size are run-length duration tokens, see `quantize`
+        self.codebook_size = self.vq_codes + 1 if self.mask_embs else self.vq_codes
+
         #! HARDCODE values
         self.stoks_len = 1500 // self.downsample
-        self.positions = torch.arange(0, 1500, dtype=torch.long)
+        self.register_buffer(
+            "positions", torch.arange(0, 1500, dtype=torch.long), persistent=False
+        )
+        # optional ichigo.asr.arch.Workspace for the dequantize intermediates
+        self.workspace = None
 
         # Initialize components
         self._init_model_components()
@@ -111,7 +119,7 @@ class Quantizer(nn.Module):
             return x[:, :: self.downsample]
 
     @torch.no_grad()
-    def quantize(self, embs, n_frames):
+    def quantize(self, embs, n_frames, compress=False, max_run=16):
         x = self.downsample_embeddings(embs)
         x = x + self.mlp(self.mlp_ln(x))
 
@@ -119,12 +127,25 @@ class Quantizer(nn.Module):
         stoks = stoks.squeeze(-1)
 
         if self.mask_embs:
-            return stoks[:, : n_frames // 2 // self.downsample]
-        else:
-            return stoks
+            stoks = stoks[:, : n_frames // 2 // self.downsample]
+
+        if compress:
+            # runs of repeated codes become (code, codebook_size + run length)
+            assert stoks.shape[0] == 1, "batch processing is not supported"
+            compressed = rle_compress(stoks[0].tolist(), self.codebook_size, max_run)
+            stoks = torch.tensor([compressed], dtype=stoks.dtype, device=stoks.device)
 
+        return stoks
+
+    @torch.no_grad()
     def dequantize(self, stoks):
         stoks = stoks.squeeze()
+        if stoks.dim() == 1 and (stoks >= self.codebook_size).any():
+            stoks = torch.tensor(
+                rle_expand(stoks.tolist(), self.codebook_size),
+                dtype=stoks.dtype,
+                device=stoks.device,
+            )
 
         # Dequantize
         assert self.q_depth == 1
@@ -136,16 +157,36 @@ class Quantizer(nn.Module):
             value=2048 if self.mask_embs else 0,  # TODO: DONT HARDCODE
         )
 
-        x = self.rq.layers[0]._codebook.embed[0, stoks.to(torch.long).view(-1)]
-        x = x.repeat_interleave(self.downsample, -2)
-
+        embed = self.rq.layers[0]._codebook.embed[0]
         project_out = (
             getattr(self.rq, "project_out", None) or self.rq.layers[0].project_out
         )
-        x = project_out(x).unsqueeze(0)
 
-        positions = torch.arange(0, x.shape[-2], dtype=torch.long, device=x.device)
-        x = x + self.positional_embedding(positions)
+        if self.workspace is None:
+            x = embed[stoks.to(torch.long).view(-1)]
+            x = x.repeat_interleave(self.downsample, -2)
+            x = project_out(x).unsqueeze(0)
+            x = x + self.positional_embedding(self.positions[: x.shape[-2]])
+            return self.ln_post(self.out_blocks(x))
+
+        # same as above, written into reused buffers
+        n = stoks.shape[-1] * self.downsample
+        ws = self.workspace
+        index = ws.get("stoks_index", (stoks.shape[-1], self.downsample), torch.long)
+        index.copy_(stoks.view(-1, 1).expand(-1, self.downsample))
+        codes = ws.get("codes", (n, embed.shape[-1]), embed.dtype)
+        torch.index_select(embed, 0, index.view(-1), out=codes)
+
+        if isinstance(project_out, nn.Linear):
+            x = ws.get("project_out", (n, project_out.out_features), codes.dtype)
+            if project_out.bias is None:
+                torch.mm(codes, project_out.weight.t(), out=x)
+            else:
+                torch.addmm(project_out.bias, codes, project_out.weight.t(), out=x)
+        else:
+            x = project_out(codes)
+        x = x.unsqueeze(0)
+        x.add_(self.positional_embedding.weight[:n])
 
         return self.ln_post(self.out_blocks(x))
 
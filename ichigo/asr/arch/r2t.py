@@ -1,19 +1,78 @@
+import dataclasses
+
 import torch
 import torch.nn as nn
 import whisper
+from whisper.decoding import DecodingTask
+
+from ichigo.asr.arch.layers import empty_whisper
 
 
 class Rep2Text(nn.Module):
-    def __init__(self, config):
+    def __init__(self, config, device=None, dims=None):
         super().__init__()
         self.config = config["r2t"]
         self.whisper_name = config["whisper_name"]
         self.decoding_options = whisper.DecodingOptions(
             **self.config["decoding_options"]
         )
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model = whisper.load_model(self.whisper_name, device=device)
-        del self.model.encoder
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        if dims is None:
+            self.model = whisper.load_model(self.whisper_name, device=device)
+            del self.model.encoder
+        else:  # empty model, the caller loads the weights (see ichigo.asr.snapshot)
+            self.model = empty_whisper(dims, encoder=False)
+            if self.whisper_name in whisper._ALIGNMENT_HEADS:
+                self.model.set_alignment_heads(whisper._ALIGNMENT_HEADS[self.whisper_name])
 
     def forward(self, dequantize_embed):
         return self.model.decode(dequantize_embed, self.decoding_options)
+
+    @torch.no_grad()
+    def stream(self, dequantize_embed):
+        """Greedy-decode a single input, yielding text deltas as tokens are produced.
+
+        Beam search and sampling options are ignored. The concatenated deltas
+        match `forward(...)[0].text` with greedy decoding.
+        """
+        assert dequantize_embed.shape[0] == 1, "batch processing is not supported"
+        options = dataclasses.replace(
+            self.decoding_options, beam_size=None, best_of=None, temperature=0.0
+        )
+        task = DecodingTask(self.model, options)
+        tokenizer = task.tokenizer
+
+        audio_features = task._get_audio_features(dequantize_embed)
+        tokens = torch.tensor([task.initial_tokens])
+        task._detect_language(audio_features, tokens)
+        tokens = tokens.to(audio_features.device)
+
+        text = ""
+        try:
+            for _ in range(task.sample_len):
+                logits = task.inference.logits(tokens, audio_features)[:, -1]
+                for logit_filter in task.logit_filters:
+                    logit_filter.apply(logits, tokens)
+
+                next_token = logits.argmax(dim=-1, keepdim=True)
+                if next_token.item() == tokenizer.eot:
+                    break
+                tokens = torch.cat([tokens, next_token], dim=-1)
+                if tokens.shape[-1] > task.n_ctx:
+                    break
+
+                new_text = tokenizer.decode(tokens[0, task.sample_begin :].tolist())
+                new_text = new_text.lstrip()
+                # wait for the rest of a multi-byte character split across tokens
+                if new_text.endswith("\ufffd") or not new_text.startswith(text):
+                    continue
+                if len(new_text) > len(text):
+                    yield new_text[len(text) :]
+                    text = new_text
+        finally:
+            task.inference.cleanup_caching()
+
+        final_text = tokenizer.decode(tokens[0, task.sample_begin :].tolist()).strip()
+        if final_text.startswith(text) and len(final_text) > len(text):
+            yield final_text[len(text) :]
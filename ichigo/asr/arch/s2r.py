@@ -3,20 +3,35 @@ import torch.nn as nn
 import torch.nn.functional as F
 import whisper
 
+from ichigo.asr.arch.layers import empty_whisper
+
 
 class Speech2Rep(nn.Module):
-    def __init__(self, config):
+    def __init__(self, config, device=None, dims=None):
         super().__init__()
         self.config = config["s2r"]
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model = whisper.load_model(config["whisper_name"], device=device)
-        del self.model.decoder
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        if dims is None:
+            self.model = whisper.load_model(config["whisper_name"], device=device)
+            del self.model.decoder
+        else:  # empty model, the caller loads the weights (see ichigo.asr.snapshot)
+            self.model = empty_whisper(dims, decoder=False)
+        # optional ichigo.asr.arch.Workspace holding the padded mel
+        self.workspace = None
 
     def forward(self, wav):
         mel = whisper.log_mel_spectrogram(wav)
         n_frames = mel.shape[-1]
 
-        if n_frames > whisper.audio.N_FRAMES:
+        if self.workspace is not None:
+            n_frames = min(n_frames, whisper.audio.N_FRAMES)
+            padded = self.workspace.get(
+                "mel", (*mel.shape[:-1], whisper.audio.N_FRAMES), mel.dtype, mel.device
+            )
+            padded[..., :n_frames].copy_(mel[..., :n_frames])
+            padded[..., n_frames:].fill_(-1.5)
+        elif n_frames > whisper.audio.N_FRAMES:
             padding = 0
             padded = mel[:, :, : whisper.audio.N_FRAMES]
             n_frames = whisper.audio.N_FRAMES
@@ -0,0 +1,62 @@
+import math
+from typing import Optional, Union
+
+import torch
+
+
+class Workspace:
+    """
+    Preallocated tensors reused across calls to keep allocations out of the hot loop.
+
+    Buffers are keyed by name, dtype and device and only grow, to a power of two
+    number of elements, so a server settles on a fixed set of allocations.
+    Tensors handed out are views into these buffers: they are overwritten by the
+    next request for the same name, so a workspace must not be shared by calls
+    running concurrently.
+
+    Args:
+        device (str): Default device of the buffers
+        pin_memory (bool, optional): Pin host staging buffers used to copy inputs
+            to the GPU. Defaults to True.
+    """
+
+    def __init__(self, device: Union[str, torch.device], pin_memory: bool = True):
+        self.device = torch.device(device)
+        self.pin_memory = pin_memory and torch.cuda.is_available()
+        self._buffers = {}
+
+    def get(
+        self,
+        name: str,
+        shape: tuple,
+        dtype: torch.dtype = torch.float32,
+        device: Optional[Union[str, torch.device]] = None,
+    ) -> torch.Tensor:
+        """Uninitialized contiguous tensor of `shape` backed by the `name` buffer"""
+        device = torch.device(device) if device is not None else self.device
+        numel = math.prod(shape)
+        key = (name, dtype, device)
+
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.numel() < numel:
+            capacity = 1 << max(numel - 1, 0).bit_length()
+            pin = self.pin_memory and device.type == "cpu"
+            buffer = torch.empty(capacity, dtype=dtype, device=device, pin_memory=pin)
+            self._buffers[key] = buffer
+        return buffer[:numel].view(shape)
+
+    def to_device(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Copy a host tensor to the workspace device through a pinned staging buffer"""
+        if tensor.device == self.device or self.device.type == "cpu":
+            return tensor.to(self.device)
+
+        host = self.get("staging", tuple(tensor.shape), tensor.dtype, "cpu")
+        host.copy_(tensor)
+        out = self.get("staging", tuple(tensor.shape), tensor.dtype)
+        return out.copy_(host, non_blocking=self.pin_memory)
+
+    def nbytes(self) -> int:
+        return sum(b.numel() * b.element_size() for b in self._buffers.values())
+
+    def clear(self):
+        self._buffers.clear()
@@ -0,0 +1,8 @@
+from pathlib import Path
+
+CONFIG_DIR = Path(__file__).parent
+
+
+def available_configs() -> list[str]:
+    """Names of the bundled configs, usable as `IchigoASR(config=...)`"""
+    return sorted(p.stem for p in CONFIG_DIR.glob("*.yaml"))
@@ -0,0 +1,254 @@
+"""
+Sharded, append-only storage for sound tokens.
+
+Each shard `shard-XXXXX` is made of:
+    .bin    flat uint16 token stream
+    .idx    int64 (offset, length) pairs into .bin, one per record
+    .keys   record keys, one per line
+    .json   sidecar with record and token counts, written on close
+
+`manifest.json` at the root describes the dataset. Keys are assigned to
+shards by a stable hash, so re-running an export puts every clip in the same
+shard, and writers with different `rank` never touch the same files.
+"""
+
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+import numpy as np
+
+from ichigo.asr.tokens import stoks_to_str
+
+FORMAT_VERSION = 1
+DTYPE = np.uint16
+INDEX_DTYPE = np.int64
+
+
+def shard_of(key: str, num_shards: int) -> int:
+    return zlib.crc32(key.encode("utf-8")) % num_shards
+
+
+def _shard_name(shard: int) -> str:
+    return f"shard-{shard:05d}"
+
+
+class _ShardFiles:
+    def __init__(self, root: Path, shard: int):
+        self.prefix = root / _shard_name(shard)
+        self.lock = threading.Lock()
+
+        # drop records left half-written by an interrupted writer. The three
+        # files are buffered separately, so keep only the records present in all
+        index_path = self.prefix.with_suffix(".idx")
+        keys_path = self.prefix.with_suffix(".keys")
+        data_path = self.prefix.with_suffix(".bin")
+        index = np.empty(0, INDEX_DTYPE)
+        if index_path.exists():
+            index = np.fromfile(index_path, dtype=INDEX_DTYPE)
+        index = index[: len(index) // 2 * 2].reshape(-1, 2)
+        keys_text = keys_path.read_text(encoding="utf-8") if keys_path.exists() else ""
+        keys = keys_text.split("\n")[:-1]  # a trailing line without newline is partial
+        n_data = 0
+        if data_path.exists():
+            n_data = os.path.getsize(data_path) // np.dtype(DTYPE).itemsize
+
+        # records are appended in order, so the complete ones are a prefix
+        n_records = min(len(index), len(keys), int((index.sum(-1) <= n_data).sum()))
+        index = index[:n_records]
+        end = int(index[-1].sum()) if n_records else 0
+
+        with open(index_path, "ab") as f:
+            f.truncate(index.nbytes)
+        with open(data_path, "ab") as f:
+            f.truncate(end * np.dtype(DTYPE).itemsize)
+        keys_text_valid = "".join(k + "\n" for k in keys[:n_records])
+        if keys_text != keys_text_valid:
+            keys_path.write_text(keys_text_valid, encoding="utf-8")
+
+        self.data = open(data_path, "ab")
+        self.index = open(index_path, "ab")
+        self.keys = open(keys_path, "a", encoding="utf-8")
+        self.offset = end
+        self.n_records = n_records
+        self.n_tokens = end
+
+    def append(self, key: str, tokens: np.ndarray):
+        with self.lock:
+            self.data.write(tokens.tobytes())
+            self.keys.write(key + "\n")
+            # flush before indexing, so an indexed record always has its data and key
+            self.data.flush()
+            self.keys.flush()
+            self.index.write(np.array([self.offset, len(tokens)], INDEX_DTYPE).tobytes())
+            self.offset += len(tokens)
+            self.n_records += 1
+            self.n_tokens += len(tokens)
+
+    def close(self):
+        with self.lock:
+            for f in (self.data, self.keys, self.index):
+                f.close()
+            sidecar = dict(records=self.n_records, tokens=self.n_tokens)
+            self.prefix.with_suffix(".json").write_text(json.dumps(sidecar))
+
+
+class ShardedTokenWriter:
+    """
+    Thread-safe writer of sound token sequences into a sharded dataset.
+
+    Args:
+        root: Output directory
+        num_shards: Number of shards keys are hashed into
+        rank: Index of this writer among `world_size` parallel writers
+        world_size: Number of parallel writers (e.g. processes). Writer `rank` owns
+            the shards `s` with `s % world_size == rank`
+        metadata: Extra fields stored in the manifest
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        num_shards: int = 64,
+        rank: int = 0,
+        world_size: int = 1,
+        metadata: Optional[dict] = None,
+    ):
+        self.root = Path(root)
+        self.num_shards = num_shards
+        self.rank = rank
+        self.world_size = world_size
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        manifest = dict(
+            version=FORMAT_VERSION,
+            num_shards=num_shards,
+            dtype=np.dtype(DTYPE).name,
+            index_dtype=np.dtype(INDEX_DTYPE).name,
+            **(metadata or {}),
+        )
+        # the first writer of any rank creates the manifest. Written to a temporary
+        # file then renamed, so other ranks never read it half-written
+        manifest_path = self.root / "manifest.json"
+        if not manifest_path.exists():
+            tmp_path = manifest_path.with_name(f"manifest.json.tmp-{rank}-{os.getpid()}")
+            tmp_path.write_text(json.dumps(manifest, indent=2))
+            tmp_path.replace(manifest_path)
+
+        existing = json.loads(manifest_path.read_text())
+        # records of one dataset must share their sharding and token encoding
+        for field in ("num_shards", "compressed", "dur_base"):
+            if existing.get(field) != manifest.get(field):
+                raise ValueError(
+                    f"{self.root} was written with {field}={existing.get(field)}"
+                )
+
+        self._shards: dict[int, _ShardFiles] = {}
+        self._lock = threading.Lock()
+
+    def owns(self, key: str) -> bool:
+        return shard_of(key, self.num_shards) % self.world_size == self.rank
+
+    def _shard(self, shard: int) -> _ShardFiles:
+        with self._lock:
+            if shard not in self._shards:
+                self._shards[shard] = _ShardFiles(self.root, shard)
+            return self._shards[shard]
+
+    def write(self, key: str, tokens):
+        """Append one token sequence. `tokens` is any 1-D int array, list or tensor"""
+        if "".join(key.splitlines()) != key:  # \n, \r, \u2028, ...
+            raise ValueError(f"Keys cannot contain line breaks: {key!r}")
+        shard = shard_of(key, self.num_shards)
+        if shard % self.world_size != self.rank:
+            raise ValueError(f"Key {key!r} belongs to another rank")
+
+        if hasattr(tokens, "cpu"):
+            tokens = tokens.cpu().numpy()
+        tokens = np.asarray(tokens).reshape(-1)
+        if tokens.size and (tokens.min() < 0 or tokens.max() > np.iinfo(DTYPE).max):
+            raise ValueError(f"Token ids out of {np.dtype(DTYPE).name} range")
+
+        self._shard(shard).append(key, tokens.astype(DTYPE))
+
+    def close(self):
+        with self._lock:
+            for shard in self._shards.values():
+                shard.close()
+            self._shards.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ShardedTokenReader:
+    """
+    Random-access reader of a dataset written by `ShardedTokenWriter`.
+
+    Records are returned as read-only numpy views into memory-mapped shards,
+    nothing is copied until the caller does so.
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        self.manifest = json.loads((self.root / "manifest.json").read_text())
+        if self.manifest["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported dataset version {self.manifest['version']}")
+
+        self._data = []
+        self._index = []
+        self._record_shard = []
+        self.keys = []
+        for shard in range(self.manifest["num_shards"]):
+            prefix = self.root / _shard_name(shard)
+            if not prefix.with_suffix(".idx").exists():
+                continue
+            index = np.fromfile(prefix.with_suffix(".idx"), dtype=INDEX_DTYPE)
+            index = index[: len(index) // 2 * 2].reshape(-1, 2)
+
+            data_path = prefix.with_suffix(".bin")
+            if os.path.getsize(data_path) > 0:
+                data = np.memmap(data_path, dtype=DTYPE, mode="r")
+            else:
+                data = np.empty(0, dtype=DTYPE)
+            # ignore records whose tokens were not fully flushed
+            index = index[index.sum(-1) <= len(data)]
+
+            keys = prefix.with_suffix(".keys").read_text(encoding="utf-8")
+            keys = keys.split("\n")[:-1]  # as in _ShardFiles, only \n ends a key
+            self.keys.extend(keys[: len(index)])
+            self._record_shard.append(np.full(len(index), len(self._data)))
+            self._data.append(data)
+            self._index.append(index)
+
+        self._index = (
+            np.concatenate(self._index) if self._index else np.empty((0, 2), INDEX_DTYPE)
+        )
+        self._record_shard = (
+            np.concatenate(self._record_shard) if self._record_shard else np.empty(0, int)
+        )
+        self._positions = {key: i for i, key in enumerate(self.keys)}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        offset, length = self._index[i]
+        return self._data[self._record_shard[i]][offset : offset + length]
+
+    def __iter__(self) -> Iterator[tuple[str, np.ndarray]]:
+        for i, key in enumerate(self.keys):
+            yield key, self[i]
+
+    def get(self, key: str) -> np.ndarray:
+        return self[self._positions[key]]
+
+    def as_string(self, i: int) -> str:
+        """Record `i` in the <|sound_xxxx|> form used by the LLM"""
+        return stoks_to_str(self[i].tolist(), self.manifest.get("dur_base"))
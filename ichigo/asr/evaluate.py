@@ -0,0 +1,295 @@
+"""
+Accuracy vs speed evaluation of IchigoASR configurations.
+
+A manifest lists audio files with reference transcripts, either as JSONL
+(`{"audio": "path.wav", "text": "..."}` per line) or as TSV (`path<TAB>text`,
+the format written by `IchigoASR.transcribe` for folders). Relative paths are
+resolved against the manifest folder.
+
+Example:
+    python -m ichigo.asr.evaluate test.jsonl --configs configs.json --output report
+    python -m ichigo.asr.evaluate --synthetic /tmp/fixtures --device cpu
+
+`configs.json` is a list of IchigoASR kwargs, each with an optional "name":
+    [{"name": "greedy"}, {"name": "beam5", "decoding_options": {"beam_size": 5}}]
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+import wave
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import torch
+import torchaudio
+
+from ichigo.asr.transcriber import IchigoASR
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace. Diacritics are kept"""
+    text = unicodedata.normalize("NFC", text).lower()
+    text = "".join(
+        " " if unicodedata.category(c).startswith(("P", "S")) else c for c in text
+    )
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def edit_distance(ref: list, hyp: list) -> int:
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i]
+        for j, h in enumerate(hyp, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h)))
+        prev = cur
+    return prev[-1]
+
+
+def error_rate(refs: list[str], hyps: list[str], unit: str = "word") -> Optional[float]:
+    """Corpus-level WER (unit="word") or CER (unit="char") over normalized text"""
+    errors = length = 0
+    for ref, hyp in zip(refs, hyps):
+        ref, hyp = normalize_text(ref), normalize_text(hyp)
+        if unit == "word":
+            ref, hyp = ref.split(), hyp.split()
+        else:
+            ref, hyp = list(ref.replace(" ", "")), list(hyp.replace(" ", ""))
+        errors += edit_distance(ref, hyp)
+        length += len(ref)
+    return errors / length if length else None
+
+
+def load_manifest(path: Union[str, Path]) -> list[dict]:
+    path = Path(path)
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if path.suffix == ".jsonl":
+                item = json.loads(line)
+            else:
+                audio, _, text = line.rstrip("\n").partition("\t")
+                item = dict(audio=audio, text=text)
+            item["audio"] = str(path.parent / item["audio"])
+            items.append(item)
+    return items
+
+
+def make_synthetic_manifest(folder: Union[str, Path], n: int = 4) -> Path:
+    """Write short silent and tone clips with empty references, for offline smoke runs"""
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    sample_rate = 16000
+
+    with open(folder / "manifest.jsonl", "w", encoding="utf-8") as manifest:
+        for i in range(n):
+            n_samples = sample_rate * (1 + i)
+            freq = 0 if i % 2 == 0 else 220 * (i + 1)
+            samples = array(
+                "h",
+                (
+                    int(8000 * math.sin(2 * math.pi * freq * t / sample_rate))
+                    for t in range(n_samples)
+                ),
+            )
+            name = f"synthetic_{i}.wav"
+            with wave.open(str(folder / name), "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(sample_rate)
+                f.writeframes(samples.tobytes())
+            manifest.write(json.dumps(dict(audio=name, text="")) + "\n")
+
+    return folder / "manifest.jsonl"
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def rss_sampler(interval: float = 0.05):
+    """Yield a dict whose "peak" is set, on exit, to the highest RSS above the
+    level at entry, sampled every `interval` seconds"""
+    result = dict(peak=None)
+    baseline = current_rss()
+    if baseline is None:
+        yield result
+        return
+
+    peak = baseline
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.wait(interval):
+            peak = max(peak, current_rss())
+
+    thread = threading.Thread(target=sample, daemon=True)
+    thread.start()
+    try:
+        yield result
+    finally:
+        done.set()
+        thread.join()
+        result["peak"] = max(peak, current_rss()) - baseline
+
+
+def evaluate_config(
+    items: list[dict],
+    model: IchigoASR,
+    num_workers: int = 4,
+) -> dict:
+    """Transcribe all manifest items with one model.
+
+    Audio is loaded by `num_workers` threads in parallel, inference calls are
+    serialized on the model. Latency is per item, from loaded audio to text.
+    """
+    lock = threading.Lock()
+
+    def run(item):
+        wav, sr = torchaudio.load(item["audio"])
+        if wav.shape[0] > 1:
+            wav = wav.mean(0, keepdim=True)
+        with lock, torch.no_grad():
+            start = time.perf_counter()
+            text = model.infer(model.preprocess(wav, sr))
+            latency = time.perf_counter() - start
+        return text, latency, wav.shape[1] / sr
+
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        outputs = list(pool.map(run, items))
+
+    hyps = [text for text, _, _ in outputs]
+    refs = [item["text"] for item in items]
+    latencies = [latency for _, latency, _ in outputs]
+    duration = sum(d for _, _, d in outputs)
+
+    return {
+        "n": len(items),
+        "wer": error_rate(refs, hyps, "word"),
+        "cer": error_rate(refs, hyps, "char"),
+        "rtf": sum(latencies) / duration if duration > 0 else None,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p90": percentile(latencies, 90),
+        "latency_p99": percentile(latencies, 99),
+        "hypotheses": hyps,
+    }
+
+
+def evaluate(
+    manifest: Union[str, Path],
+    configs: list[dict],
+    num_workers: int = 4,
+    model_factory: Callable[..., IchigoASR] = IchigoASR,
+) -> list[dict]:
+    """Evaluate each config (IchigoASR kwargs plus an optional "name") on a manifest.
+
+    Memory is reported per config: the peak RSS increase over the level before
+    the model was loaded, and the peak CUDA allocation.
+    """
+    items = load_manifest(manifest)
+    results = []
+    for config in configs:
+        kwargs = {k: v for k, v in config.items() if k != "name"}
+        name = config.get("name") or json.dumps(kwargs, sort_keys=True)
+
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+            torch.cuda.reset_peak_memory_stats()
+
+        # memory is measured from before the model is loaded, so it includes the weights
+        with rss_sampler() as rss:
+            model = model_factory(**kwargs)
+            result = evaluate_config(items, model, num_workers)
+            del model
+
+        result["rss_delta_mb"] = rss["peak"] / 2**20 if rss["peak"] is not None else None
+        result["peak_cuda_mb"] = (
+            torch.cuda.max_memory_allocated() / 2**20 if torch.cuda.is_available() else None
+        )
+        results.append(dict(name=name, config=kwargs, **result))
+    return results
+
+
+def to_markdown(results: list[dict]) -> str:
+    def fmt(value, spec):
+        return "-" if value is None else format(value, spec)
+
+    lines = [
+        "| config | n | WER | CER | RTF | p50 (s) | p90 (s) | p99 (s) | RSS delta (MB) | peak CUDA (MB) |",
+        "|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    for r in results:
+        lines.append(
+            f"| {r['name']} | {r['n']} | {fmt(r['wer'], '.2%')} | {fmt(r['cer'], '.2%')} "
+            f"| {fmt(r['rtf'], '.3f')} | {fmt(r['latency_p50'], '.3f')} "
+            f"| {fmt(r['latency_p90'], '.3f')} | {fmt(r['latency_p99'], '.3f')} "
+            f"| {fmt(r['rss_delta_mb'], '.0f')} | {fmt(r['peak_cuda_mb'], '.0f')} |"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("manifest", nargs="?", help="JSONL or TSV manifest")
+    parser.add_argument("--configs", help="JSON file with a list of IchigoASR kwargs")
+    parser.add_argument("--device", help="Device for configs that do not set one")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output", help="Write <output>.json and <output>.md")
+    parser.add_argument(
+        "--synthetic", metavar="DIR", help="Generate synthetic fixtures in DIR and use them"
+    )
+    args = parser.parse_args()
+
+    if args.synthetic:
+        args.manifest = make_synthetic_manifest(args.synthetic)
+    if not args.manifest:
+        parser.error("a manifest or --synthetic is required")
+
+    configs = [{}]
+    if args.configs:
+        with open(args.configs) as f:
+            configs = json.load(f)
+    if args.device:
+        configs = [dict(device=args.device, **c) if "device" not in c else c for c in configs]
+
+    results = evaluate(args.manifest, configs, args.workers)
+    table = to_markdown(results)
+    print(table)
+
+    if args.output:
+        with open(f"{args.output}.json", "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        with open(f"{args.output}.md", "w", encoding="utf-8") as f:
+            f.write(table + "\n")
+
+
+if __name__ == "__main__":
+    main()
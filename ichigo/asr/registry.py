@@ -0,0 +1,153 @@
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+
+import torch
+
+from ichigo.asr.transcriber import IchigoASR
+
+DEFAULT_CONFIG = "merge-2560d"
+
+
+def default_device() -> str:
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+class _Entry:
+    def __init__(self, model: IchigoASR):
+        self.model = model
+        self.size = model.memory_footprint()
+        self.refs = 0
+
+
+class ModelRegistry:
+    """Thread-safe cache of IchigoASR instances keyed by their constructor kwargs.
+
+    Args:
+        memory_budget: Max total bytes of resident models. When exceeded, the
+            least recently used idle models are evicted. None means unlimited.
+        max_workers: Number of background threads used by `warmup`.
+    """
+
+    def __init__(self, memory_budget: Optional[int] = None, max_workers: int = 1):
+        self.memory_budget = memory_budget
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._loading: dict[str, Future] = {}
+        self._executor = None
+
+    @staticmethod
+    def _normalize(kwargs: dict) -> dict:
+        return {"config": DEFAULT_CONFIG, "device": default_device(), **kwargs}
+
+    @staticmethod
+    def _key(kwargs: dict) -> str:
+        return json.dumps(kwargs, sort_keys=True, default=str)
+
+    def _load(self, key: str, kwargs: dict, future: Future):
+        try:
+            model = IchigoASR(**kwargs)
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._loading.pop(key, None)
+            self._entries[key] = _Entry(model)
+            self._evict(keep=key)
+        future.set_result(model)
+
+    def _evict(self, keep: str):
+        """Drop LRU idle models until within budget. Caller must hold the lock."""
+        if self.memory_budget is None:
+            return
+
+        evicted = False
+        for key in list(self._entries):
+            if self.resident_bytes() <= self.memory_budget:
+                break
+            entry = self._entries[key]
+            if key == keep or entry.refs > 0:
+                continue
+            del self._entries[key]
+            evicted = True
+
+        if evicted and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def _get(self, kwargs: dict, pin: bool) -> IchigoASR:
+        kwargs = self._normalize(kwargs)
+        key = self._key(kwargs)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.refs += pin
+                return entry.model
+
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                future = self._loading[key] = Future()
+
+        if owner:
+            self._load(key, kwargs, future)
+        model = future.result()
+
+        if pin:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:  # evicted between load and pin, re-admit it
+                    entry = self._entries[key] = _Entry(model)
+                entry.refs += 1
+        return model
+
+    def get(self, **kwargs) -> IchigoASR:
+        """Return the model for `kwargs`, loading it if it is not resident"""
+        return self._get(kwargs, pin=False)
+
+    @contextmanager
+    def use(self, **kwargs):
+        """Like `get`, but the model cannot be evicted while the context is open"""
+        model = self._get(kwargs, pin=True)
+        key = self._key(self._normalize(kwargs))
+        try:
+            yield model
+        finally:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refs -= 1
+                    self._evict(keep=key)
+
+    def warmup(self, **kwargs) -> Future:
+        """Load a model in the background and return a future for it"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="ichigo-warmup"
+                )
+        return self._executor.submit(self.get, **kwargs)
+
+    def evict(self, **kwargs) -> bool:
+        """Drop a model from the registry. Returns False if it is absent or in use"""
+        key = self._key(self._normalize(kwargs))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.refs > 0:
+                return False
+            del self._entries[key]
+        return True
+
+    def resident_bytes(self) -> int:
+        return sum(entry.size for entry in self._entries.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,116 @@
+"""
+Warm-start snapshots of a prepared IchigoASR pipeline.
+
+A snapshot is a single torch file holding the resolved config, the weights of
+the three stages, the rotary tables built during warm-up and the CPU thread
+profile. Loading it skips the config parsing, the Whisper and quantizer
+checkpoint downloads and the random init of the modules, which are built on
+the meta device, and the weights are memory-mapped instead of read upfront.
+
+Example:
+    python -m ichigo.asr.snapshot --config merge-2560d --output ichigo-asr.pt
+    model = IchigoASR(snapshot="ichigo-asr.pt")
+"""
+
+import argparse
+import dataclasses
+from pathlib import Path
+from typing import Union
+
+import torch
+
+from ichigo.asr.arch.layers import Rotary
+
+SNAPSHOT_FORMAT = "ichigo-asr-snapshot"
+SNAPSHOT_VERSION = 2
+
+
+def _module_state(module: torch.nn.Module) -> dict:
+    """State dict plus the non-persistent buffers, which modules built on the
+    meta device do not hold either. Sparse buffers are left to the module"""
+    state = {k: v.detach().cpu() for k, v in module.state_dict().items()}
+    buffers = {
+        k: v.cpu()
+        for k, v in module.named_buffers()
+        if k not in state and not v.is_sparse
+    }
+    return dict(state=state, buffers=buffers)
+
+
+def load_module(module: torch.nn.Module, state: dict):
+    """Fill a module built on the meta device (or an initialized one) with
+    `_module_state` output, taking over the tensors instead of copying them"""
+    module.load_state_dict(state["state"], assign=True)
+    for name, buffer in state["buffers"].items():
+        owner, _, attr = name.rpartition(".")
+        module.get_submodule(owner).register_buffer(attr, buffer, persistent=False)
+
+
+def rotary_tables(module: torch.nn.Module) -> dict:
+    return {
+        name: dict(cos=m.cos_cached.cpu(), sin=m.sin_cached.cpu(), seq_len=m.seq_len_cached)
+        for name, m in module.named_modules()
+        if isinstance(m, Rotary) and m.cos_cached is not None
+    }
+
+
+def load_rotary_tables(module: torch.nn.Module, tables: dict, device):
+    modules = dict(module.named_modules())
+    for name, table in tables.items():
+        rotary = modules[name]
+        rotary.cos_cached = table["cos"].to(device)
+        rotary.sin_cached = table["sin"].to(device)
+        rotary.seq_len_cached = table["seq_len"]
+
+
+def save_snapshot(model, path: Union[str, Path]):
+    """Serialize a prepared IchigoASR. Run `model.warmup()` first to include the rotary tables"""
+    snapshot = dict(
+        format=SNAPSHOT_FORMAT,
+        version=SNAPSHOT_VERSION,
+        torch_version=str(torch.__version__),
+        config_name=model.config_name,
+        config=model.config,
+        whisper_dims=dataclasses.asdict(model.s2r.model.dims),
+        s2r=_module_state(model.s2r),
+        quantizer=_module_state(model.quantizer),
+        r2t=_module_state(model.r2t),
+        rotary=rotary_tables(model.quantizer),
+        thread_profile=model.thread_profile,
+    )
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    torch.save(snapshot, tmp_path)
+    tmp_path.replace(path)
+
+
+def load_snapshot(path: Union[str, Path]) -> dict:
+    """Load a snapshot with its tensors memory-mapped from the file"""
+    snapshot = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    if snapshot.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path} is not an Ichigo ASR snapshot")
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(
+            f"Unsupported snapshot version {snapshot.get('version')}, "
+            f"expected {SNAPSHOT_VERSION}. Please recreate the snapshot"
+        )
+    return snapshot
+
+
+def main():
+    from ichigo.asr.transcriber import IchigoASR
+
+    parser = argparse.ArgumentParser(description="Create an Ichigo ASR snapshot")
+    parser.add_argument("--config", default="merge-2560d")
+    parser.add_argument("--device", help="Device used to prepare the pipeline")
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    model = IchigoASR(config=args.config, device=args.device)
+    model.warmup()
+    save_snapshot(model, args.output)
+    print(f"Saved snapshot to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import re
+from typing import Iterable, Optional
+
+SOUND_START = "<|sound_start|>"
+SOUND_END = "<|sound_end|>"
+
+_SOUND_TOKEN = re.compile(r"<\|sound_(?:(\d{4})|dur_(\d+))\|>")
+
+
+def stoks_to_str(token_ids: Iterable[int], dur_base: Optional[int] = None) -> str:
+    """Format sound token ids as <|sound_start|><|sound_0000|>...<|sound_end|>
+
+    With `dur_base`, ids >= dur_base are run-length duration tokens (see
+    `rle_compress`) and are written as <|sound_dur_N|>.
+    """
+    output = "".join(
+        f"<|sound_dur_{tok - dur_base}|>"
+        if dur_base is not None and tok >= dur_base
+        else f"<|sound_{tok:04d}|>"
+        for tok in map(int, token_ids)
+    )
+    return f"{SOUND_START}{output}{SOUND_END}"
+
+
+def str_to_stoks(text: str, dur_base: Optional[int] = None) -> list[int]:
+    """Parse the output of `stoks_to_str` back into token ids"""
+    token_ids = []
+    for tok, dur in _SOUND_TOKEN.findall(text):
+        if tok:
+            token_ids.append(int(tok))
+        elif dur_base is None:
+            raise ValueError("Duration tokens found but no dur_base was given")
+        else:
+            token_ids.append(dur_base + int(dur))
+    return token_ids
+
+
+def rle_compress(token_ids: Iterable[int], dur_base: int, max_run: int = 16) -> list[int]:
+    """Run-length encode a sound token sequence.
+
+    A run of n >= 3 identical tokens becomes the token followed by the duration
+    token `dur_base + n`. Shorter runs are kept as is since they would not get
+    shorter. Runs longer than `max_run` are split, so at most `max_run - 2`
+    duration ids are used above `dur_base`.
+    """
+    output = []
+    prev, run = None, 0
+
+    def flush():
+        if run >= 3:
+            output.extend((prev, dur_base + run))
+        else:
+            output.extend([prev] * run)
+
+    for tok in map(int, token_ids):
+        if tok >= dur_base:
+            raise ValueError(f"Token {tok} collides with duration tokens")
+        if tok == prev and run < max_run:
+            run += 1
+            continue
+        if run:
+            flush()
+        prev, run = tok, 1
+    if run:
+        flush()
+
+    return output
+
+
+def rle_expand(token_ids: Iterable[int], dur_base: int) -> list[int]:
+    """Inverse of `rle_compress`"""
+    output = []
+    for tok in map(int, token_ids):
+        if tok >= dur_base:
+            if not output:
+                raise ValueError("Sequence starts with a duration token")
+            output.extend([output[-1]] * (tok - dur_base - 1))
+        else:
+            output.append(tok)
+    return output
+
+
+def compression_report(
+    sequences: Iterable[Iterable[int]], dur_base: int, max_run: int = 16
+) -> dict:
+    """Token counts before and after `rle_compress` over a corpus of sequences,
+    e.g. a `ichigo.asr.dataset.ShardedTokenReader`"""
+    n_sequences = n_tokens = n_compressed = 0
+    for sequence in sequences:
+        if isinstance(sequence, tuple):  # (key, tokens) pairs
+            sequence = sequence[1]
+        sequence = list(map(int, sequence))
+        n_sequences += 1
+        n_tokens += len(sequence)
+        n_compressed += len(rle_compress(sequence, dur_base, max_run))
+
+    return {
+        "sequences": n_sequences,
+        "tokens": n_tokens,
+        "compressed_tokens": n_compressed,
+        "ratio": n_compressed / n_tokens if n_tokens else 1.0,
+        "saving": 1 - n_compressed / n_tokens if n_tokens else 0.0,
+    }
@@ -1,7 +1,7 @@
 import time
 import warnings
 from pathlib import Path
-from typing import Dict, Optional, Union
+from typing import Dict, Iterator, Optional, Union
 
 warnings.filterwarnings(
     "ignore", category=FutureWarning, module="vector_quantize_pytorch"
@@ -10,14 +10,22 @@ warnings.filterwarnings("ignore", category=FutureWarning, module="whisper")
 warnings.filterwarnings(
     "ignore", category=FutureWarning, message="You are using `torch.load`"
 )
+import dataclasses
+
 import torch
 import torchaudio
+import whisper
 import yaml
 from huggingface_hub import hf_hub_download
 
 from ichigo.asr.arch.quantizer import Quantizer
 from ichigo.asr.arch.r2t import Rep2Text
 from ichigo.asr.arch.s2r import Speech2Rep
+from ichigo.asr.arch.workspace import Workspace
+from ichigo.asr.dataset import ShardedTokenWriter
+from ichigo.asr.snapshot import load_module, load_rotary_tables, load_snapshot, save_snapshot
+from ichigo.asr.tuning import apply_affinity, check_profile, load_profile, stage_threads
+from ichigo.asr.vad import split_on_silence, trim_silence
 
 
 def load_quantizer(ref, config):
@@ -43,37 +51,265 @@ class IchigoASR:
     def __init__(
         self,
         config: str = "merge-2560d",
+        device: Optional[str] = None,
+        vad: bool = False,
+        decoding_options: Optional[dict] = None,
+        thread_profile: Union[str, bool, None] = None,
+        workspace: bool = True,
+        snapshot: Optional[Union[str, Path]] = None,
     ):
-        # Load config
-        config_path = Path(__file__).parent / "config" / f"{config}.yaml"
-        with open(config_path) as f:
-            self.config = yaml.safe_load(f)
+        start_time = time.perf_counter()
+
+        # Load config, from the snapshot if given (see ichigo.asr.snapshot)
+        snap = load_snapshot(snapshot) if snapshot else None
+        if snap is not None:
+            self.config = snap["config"]
+            self.config_name = snap["config_name"]
+        else:
+            self.config_name = config
+            config_path = Path(__file__).parent / "config" / f"{config}.yaml"
+            with open(config_path) as f:
+                self.config = yaml.safe_load(f)
+        if decoding_options:  # override whisper.DecodingOptions from the config
+            self.config["r2t"]["decoding_options"].update(decoding_options)
+
+        # Voice activity detection: trims silence and splits long audio at pauses
+        self.vad = vad
+        self.vad_options = self.config.get("vad") or {}
 
         model_path = f"{self.config['model_hub']}:{self.config['model_name']}.pth"
 
-        self.s2r = Speech2Rep(self.config)
-        self.quantizer = load_quantizer(ref=model_path, config=self.config)
-        self.r2t = Rep2Text(self.config)
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = device
+
+        if snap is not None:
+            dims = whisper.model.ModelDimensions(**snap["whisper_dims"])
+            self.s2r = Speech2Rep(self.config, device=self.device, dims=dims)
+            load_module(self.s2r, snap["s2r"])
+            with torch.device("meta"):  # allocated by load_module
+                self.quantizer = Quantizer(self.config)
+            load_module(self.quantizer, snap["quantizer"])
+            self.quantizer.eval()
+            self.r2t = Rep2Text(self.config, device=self.device, dims=dims)
+            load_module(self.r2t, snap["r2t"])
+            load_rotary_tables(self.quantizer, snap["rotary"], self.device)
+        else:
+            self.s2r = Speech2Rep(self.config, device=self.device)
+            self.quantizer = load_quantizer(ref=model_path, config=self.config)
+            self.r2t = Rep2Text(self.config, device=self.device)
 
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.s2r.to(self.device)
         self.quantizer.to(self.device)
         self.r2t.to(self.device)
 
+        # Reused buffers for the fixed-shape s2r -> quantizer tensors and input
+        # staging. Calls on one instance must not run concurrently
+        self.workspace = Workspace(self.device) if workspace else None
+        self.s2r.workspace = self.workspace
+        self.quantizer.workspace = self.workspace
+
+        # Per-stage CPU threads from `python -m ichigo.asr.tuning`. None loads the
+        # snapshot's or the default profile when running on CPU, a path loads
+        # that one, False disables
+        self.thread_profile = None
+        if thread_profile is not False and self.device == "cpu":
+            if isinstance(thread_profile, (str, Path)):
+                self.thread_profile = load_profile(thread_profile)
+            elif snap is not None and snap["thread_profile"]:
+                self.thread_profile = check_profile(snap["thread_profile"], str(snapshot))
+            else:
+                self.thread_profile = load_profile()
+            apply_affinity(self.thread_profile)
+
+        self.startup_timings = {"load": time.perf_counter() - start_time}
+
+    @torch.no_grad()
+    def warmup(self, seconds: float = 1.0, sample_len: int = 8) -> float:
+        """Run dummy audio through every stage so the first request does not pay
+        for lazy init (rotary tables, workspace buffers, kernel selection).
+
+        Returns:
+            Seconds from the start of `__init__` until ready, also stored in
+            `startup_timings` next to the load and warm-up times
+        """
+        start_time = time.perf_counter()
+        wav = 0.01 * torch.randn(1, int(16000 * seconds))
+        stoks = self.encode_stoks(self.preprocess(wav, 16000))
+        options = dataclasses.replace(
+            self.r2t.decoding_options, sample_len=sample_len, beam_size=None, best_of=None
+        )
+        with stage_threads(self.thread_profile, "quantizer"):
+            dequantize_embed = self.quantizer.dequantize(stoks)
+        with stage_threads(self.thread_profile, "r2t"):
+            self.r2t.model.decode(dequantize_embed, options)
+        if self.device != "cpu" and torch.cuda.is_available():
+            torch.cuda.synchronize()
+
+        self.startup_timings["warmup"] = time.perf_counter() - start_time
+        self.startup_timings["ready"] = sum(
+            self.startup_timings[k] for k in ("load", "warmup")
+        )
+        return self.startup_timings["ready"]
+
+    def save_snapshot(self, path: Union[str, Path]):
+        """Save the prepared pipeline, see `ichigo.asr.snapshot`"""
+        save_snapshot(self, path)
+
+    def memory_footprint(self) -> int:
+        """Bytes held by parameters and buffers of all pipeline stages"""
+        return sum(
+            t.numel() * t.element_size()
+            for module in (self.s2r, self.quantizer, self.r2t)
+            for t in (*module.parameters(), *module.buffers())
+        )
+
     def preprocess(self, audio: torch.Tensor, sample_rate: int) -> torch.Tensor:
+        """Resample to 16kHz, trim silence if enabled and move to the model device.
+
+        With the workspace on GPU, the result lives in a staging buffer that the
+        next `preprocess` call overwrites.
+        """
         if sample_rate != 16000:
             audio = torchaudio.functional.resample(audio, sample_rate, 16000)
+        if self.vad:
+            audio = trim_silence(audio, **self.vad_options)
+        if self.workspace is not None:
+            return self.workspace.to_device(audio)
         return audio.to(self.device)
 
-    def get_stoks(self, input_path: Union[str, Path]):
-        """Support return stoks for a single file"""
+    @torch.no_grad()
+    def infer(self, wav: torch.Tensor) -> str:
+        """Transcribe a preprocessed 16kHz mono waveform"""
+        if wav.shape[-1] == 0:
+            return ""
+
+        if self.vad and wav.shape[-1] > whisper.audio.N_SAMPLES:
+            chunks = split_on_silence(
+                wav, whisper.audio.N_SAMPLES, **self.vad_options
+            )
+            return " ".join(filter(None, (self.infer(c) for c in chunks)))
+
+        with stage_threads(self.thread_profile, "s2r"):
+            embs, n_frames = self.s2r(wav)
+        with stage_threads(self.thread_profile, "quantizer"):
+            dequantize_embed = self.quantizer(embs, n_frames)
+        with stage_threads(self.thread_profile, "r2t"):
+            result = self.r2t(dequantize_embed)
+        return result[0].text
+
+    @torch.no_grad()
+    def infer_stream(self, wav: torch.Tensor) -> Iterator[str]:
+        """Like `infer`, but yields the transcript in pieces as it is decoded"""
+        if wav.shape[-1] == 0:
+            return
+
+        if self.vad and wav.shape[-1] > whisper.audio.N_SAMPLES:
+            chunks = split_on_silence(
+                wav, whisper.audio.N_SAMPLES, **self.vad_options
+            )
+            sep = ""
+            for chunk in chunks:
+                for i, delta in enumerate(self.infer_stream(chunk)):
+                    yield sep + delta if i == 0 else delta
+                    sep = " "
+            return
+
+        with stage_threads(self.thread_profile, "s2r"):
+            embs, n_frames = self.s2r(wav)
+        with stage_threads(self.thread_profile, "quantizer"):
+            dequantize_embed = self.quantizer(embs, n_frames)
+        with stage_threads(self.thread_profile, "r2t"):
+            yield from self.r2t.stream(dequantize_embed)
+
+    @torch.no_grad()
+    def encode_stoks(self, wav: torch.Tensor, compress: bool = False) -> torch.Tensor:
+        """Sound tokens of a preprocessed 16kHz mono waveform
+
+        With `compress`, runs of repeated tokens are run-length encoded, see
+        `Quantizer.quantize`. `decode_stoks` expands them back.
+        """
+        if wav.shape[-1] == 0:
+            return torch.zeros((1, 0), dtype=torch.long, device=self.device)
+
+        with stage_threads(self.thread_profile, "s2r"):
+            embs, n_frames = self.s2r(wav)
+        with stage_threads(self.thread_profile, "quantizer"):
+            return self.quantizer.quantize(embs, n_frames, compress=compress)
+
+    @torch.no_grad()
+    def decode_stoks(self, stoks: torch.Tensor) -> str:
+        """Transcript of sound tokens from `encode_stoks`"""
+        with stage_threads(self.thread_profile, "quantizer"):
+            dequantize_embed = self.quantizer.dequantize(stoks.to(self.device))
+        with stage_threads(self.thread_profile, "r2t"):
+            return self.r2t(dequantize_embed)[0].text
+
+    def get_stoks(self, input_path: Union[str, Path], compress: bool = False):
+        """Support return stoks for a single file
+
+        With `compress`, runs of repeated tokens are run-length encoded, see
+        `Quantizer.quantize`. `Quantizer.dequantize` expands them back.
+        """
         input_path = Path(input_path)
         wav, sr = torchaudio.load(str(input_path))
+        if wav.shape[0] > 1:  # Convert multi-channel audio to mono
+            wav = wav.mean(0, keepdim=True)
         wav = self.preprocess(wav, sr)
+        return self.encode_stoks(wav, compress=compress)
 
-        embs, n_frames = self.s2r(wav)
-        stoks = self.quantizer(embs, n_frames, return_stoks=True)
-        return stoks
+    def export_stoks(
+        self,
+        input_path: Union[str, Path],
+        output_path: Union[str, Path],
+        num_shards: int = 64,
+        rank: int = 0,
+        world_size: int = 1,
+        extensions: tuple = (".wav", ".mp3", ".flac"),
+        compress: bool = False,
+    ) -> int:
+        """Tokenize a folder of audio files (recursively) into a sharded token dataset.
+
+        Args:
+            input_path: Folder containing audio files
+            output_path: Dataset folder, see `ichigo.asr.dataset`
+            num_shards: Number of shards. Must stay the same across runs into one dataset
+            rank: Index of this process among `world_size` parallel exporters
+            world_size: Number of parallel exporters. Each one only tokenizes and
+                writes the files hashed into its own shards
+            extensions: Tuple of valid audio file extensions to process
+            compress: Store run-length encoded tokens, see `get_stoks`
+
+        Returns:
+            Number of files written
+        """
+        input_path = Path(input_path)
+        audio_files = sorted(
+            f
+            for f in input_path.rglob("*")
+            if f.is_file() and f.suffix.lower() in extensions
+        )
+
+        written = 0
+        metadata = dict(config=self.config["model_name"], compressed=compress)
+        if compress:
+            metadata["dur_base"] = self.quantizer.codebook_size
+        with ShardedTokenWriter(
+            output_path, num_shards, rank, world_size, metadata
+        ) as writer:
+            for audio_file in audio_files:
+                key = audio_file.relative_to(input_path).as_posix()
+                if not writer.owns(key):
+                    continue
+                try:
+                    with torch.no_grad():
+                        stoks = self.get_stoks(audio_file, compress=compress)
+                    writer.write(key, stoks.squeeze(0))
+                    written += 1
+                except Exception as e:
+                    print(f"ERROR: Error processing {key}: {str(e)}")
+
+        return written
 
     def transcribe(
         self,
@@ -103,18 +339,18 @@ class IchigoASR:
             wav, sr = torchaudio.load(str(input_path))
             if wav.shape[0] > 1:
                 wav = wav.mean(0, keepdim=True)
+            duration = wav.shape[1] / sr
             wav = self.preprocess(wav, sr)
-            duration = wav.shape[1] / 16000
+            speech_duration = wav.shape[1] / 16000
 
             # ! Inference
-            embs, n_frames = self.s2r(wav)
-            dequantize_embed = self.quantizer(embs, n_frames)
-            result = self.r2t(dequantize_embed)
-            transcript = result[0].text
+            transcript = self.infer(wav)
 
             process_time = time.time() - start_time
             metadata = {
                 "duration": duration,
+                "speech_duration": speech_duration,
+                "trimmed_duration": duration - speech_duration,
                 "process_time": process_time,
                 "rtf": process_time / duration if duration > 0 else 0,
             }
@@ -0,0 +1,228 @@
+"""
+CPU thread tuning for the IchigoASR pipeline.
+
+Benchmarks each stage (s2r encoder, quantizer, r2t decoder) across intra-op
+thread counts on this machine and saves a profile with the best count per
+stage. IchigoASR loads the profile on CPU and switches threads per stage.
+
+Example:
+    python -m ichigo.asr.tuning --threads 1,2,4,8 --batch-sizes 1,2,4
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import statistics
+import threading
+import time
+import warnings
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Optional, Union
+
+import torch
+
+PROFILE_VERSION = 1
+STAGES = ("s2r", "quantizer", "r2t")
+
+
+def default_profile_path() -> Path:
+    path = os.environ.get("ICHIGO_CPU_PROFILE")
+    if path:
+        return Path(path)
+    return Path.home() / ".cache" / "ichigo" / "cpu_profile.json"
+
+
+def machine_signature() -> dict:
+    return dict(
+        processor=platform.processor() or platform.machine(),
+        cpu_count=os.cpu_count(),
+    )
+
+
+def load_profile(path: Optional[Union[str, Path]] = None) -> Optional[dict]:
+    """Load a saved profile, or None if there is none for this machine"""
+    path = Path(path) if path else default_profile_path()
+    if not path.exists():
+        return None
+
+    return check_profile(json.loads(path.read_text()), source=str(path))
+
+
+def check_profile(profile: Optional[dict], source: str = "") -> Optional[dict]:
+    """Return the profile if it can be used on this machine, else None"""
+    if not profile:
+        return None
+    if profile.get("version") != PROFILE_VERSION:
+        warnings.warn(f"Ignoring CPU profile {source} with unsupported version")
+        return None
+    if profile.get("machine") != machine_signature():
+        warnings.warn(f"Ignoring CPU profile {source} tuned on another machine")
+        return None
+    return profile
+
+
+# torch's thread count is process-wide, so blocks running with their own count
+# are serialized. Reentrant, for a thread interleaving stages of two models
+_THREADS_LOCK = threading.RLock()
+
+
+@contextmanager
+def num_threads(n: Optional[int]):
+    """Temporarily set torch's intra-op thread count.
+
+    The count is process-wide: while the block runs, other threads entering
+    `num_threads` wait for it to finish, so concurrent requests on a profiled
+    model run their stages one at a time, each with its own budget.
+    """
+    if not n:
+        yield
+        return
+    with _THREADS_LOCK:
+        previous = torch.get_num_threads()
+        torch.set_num_threads(n)
+        try:
+            yield
+        finally:
+            torch.set_num_threads(previous)
+
+
+def stage_threads(profile: Optional[dict], stage: str):
+    """Context manager applying the profile's thread count for `stage`, if any"""
+    if not profile:
+        return nullcontext()
+    return num_threads(profile["threads"].get(stage))
+
+
+def apply_affinity(profile: Optional[dict]):
+    """Pin the process to the profile's cores, where the OS supports it"""
+    if profile and profile.get("cores") and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, profile["cores"])
+
+
+def _time(fn, repeats: int) -> float:
+    fn()  # warm-up
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def _pick(timings: dict[int, float], tolerance: float = 0.05) -> int:
+    """Fewest threads within `tolerance` of the fastest, to leave cores free"""
+    best = min(timings.values())
+    return min(n for n, t in timings.items() if t <= best * (1 + tolerance))
+
+
+@torch.no_grad()
+def benchmark(
+    model,
+    thread_counts: Optional[list[int]] = None,
+    batch_sizes: tuple = (1,),
+    repeats: int = 3,
+    seconds: float = 10.0,
+    sample_len: int = 32,
+) -> dict:
+    """Median seconds per call of each stage, per thread count.
+
+    The decoder is timed over `sample_len` tokens. Only the encoder runs
+    batched, the quantizer and decoder process one input at a time.
+    """
+    if thread_counts is None:
+        cpu_count = os.cpu_count() or 1
+        thread_counts = sorted({1, 2, 4, 8, 16, cpu_count} & set(range(1, cpu_count + 1)))
+
+    wav = 0.1 * torch.randn(1, int(16000 * seconds), device=model.device)
+    embs, n_frames = model.s2r(wav)
+    dequantize_embed = model.quantizer(embs, n_frames)
+    options = dataclasses.replace(
+        model.r2t.decoding_options, sample_len=sample_len, beam_size=None, best_of=None
+    )
+
+    results = {stage: {} for stage in STAGES}
+    results["s2r_batch"] = {}
+    for n in thread_counts:
+        with num_threads(n):
+            for batch_size in batch_sizes:
+                batch = wav.repeat(batch_size, 1)
+                t = _time(lambda: model.s2r(batch), repeats)
+                results["s2r_batch"].setdefault(str(batch_size), {})[n] = t / batch_size
+                if batch_size == 1:
+                    results["s2r"][n] = t
+            results["quantizer"][n] = _time(
+                lambda: model.quantizer(embs, n_frames), repeats
+            )
+            results["r2t"][n] = _time(
+                lambda: model.r2t.model.decode(dequantize_embed, options), repeats
+            )
+    return results
+
+
+def tune(
+    model,
+    thread_counts: Optional[list[int]] = None,
+    batch_sizes: tuple = (1,),
+    repeats: int = 3,
+    cores: Optional[list[int]] = None,
+    path: Optional[Union[str, Path]] = None,
+) -> dict:
+    """Benchmark `model` (an IchigoASR on CPU) and save the resulting profile.
+
+    Args:
+        model: IchigoASR instance on CPU
+        thread_counts: Thread counts to try. Defaults to powers of two up to the CPU count
+        batch_sizes: Encoder batch sizes to benchmark, recorded for reference
+        repeats: Timed runs per measurement, the median is kept
+        cores: CPU ids to pin the process to when the profile is applied
+        path: Where to save the profile. Defaults to `default_profile_path()`
+    """
+    if cores:
+        apply_affinity(dict(cores=cores))
+    timings = benchmark(model, thread_counts, batch_sizes, repeats)
+    profile = dict(
+        version=PROFILE_VERSION,
+        machine=machine_signature(),
+        threads={stage: _pick(timings[stage]) for stage in STAGES},
+        cores=cores,
+        timings=timings,
+    )
+
+    path = Path(path) if path else default_profile_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(profile, indent=2))
+    return profile
+
+
+def main():
+    from ichigo.asr.transcriber import IchigoASR
+
+    parser = argparse.ArgumentParser(description="Tune per-stage CPU threads")
+    parser.add_argument("--config", default="merge-2560d")
+    parser.add_argument("--threads", help="Comma separated thread counts")
+    parser.add_argument("--batch-sizes", default="1", help="Comma separated")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--cores", help="Comma separated CPU ids to pin to")
+    parser.add_argument("--output", help="Profile path")
+    args = parser.parse_args()
+
+    def ints(value):
+        return [int(x) for x in value.split(",")] if value else None
+
+    model = IchigoASR(config=args.config, device="cpu", thread_profile=False)
+    profile = tune(
+        model,
+        thread_counts=ints(args.threads),
+        batch_sizes=tuple(ints(args.batch_sizes)),
+        repeats=args.repeats,
+        cores=ints(args.cores),
+        path=args.output,
+    )
+    print(json.dumps(profile["threads"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import torch
+import torch.nn.functional as F
+
+
+def detect_speech(
+    wav: torch.Tensor,
+    sample_rate: int = 16000,
+    frame_ms: int = 30,
+    threshold_db: float = -45.0,
+    min_silence_ms: int = 300,
+    pad_ms: int = 100,
+) -> list[tuple[int, int]]:
+    """
+    Energy-based voice activity detection.
+
+    Args:
+        wav (Tensor): Audio of shape (channels, samples) or (samples,)
+        sample_rate (int, optional): Sample rate of `wav`. Defaults to 16000.
+        frame_ms (int, optional): Analysis frame length. Defaults to 30.
+        threshold_db (float, optional): Frames with RMS energy above this level
+            (dBFS) are speech. Defaults to -45.0.
+        min_silence_ms (int, optional): Pauses shorter than this are merged into
+            the surrounding speech. Defaults to 300.
+        pad_ms (int, optional): Padding kept around each speech segment. Defaults to 100.
+
+    Returns:
+        list: (start, end) sample offsets of speech segments, sorted and non-overlapping
+    """
+    x = wav.mean(0) if wav.dim() > 1 else wav
+    n_samples = x.shape[-1]
+    frame = max(1, sample_rate * frame_ms // 1000)
+
+    x = F.pad(x.float(), (0, -n_samples % frame))
+    energy = x.view(-1, frame).pow(2).mean(-1)
+    voiced = (10 * torch.log10(energy + 1e-10) > threshold_db).tolist()
+
+    segments = []
+    start = None
+    for i, v in enumerate(voiced + [False]):
+        if v and start is None:
+            start = i
+        elif not v and start is not None:
+            segments.append([start * frame, i * frame])
+            start = None
+
+    min_silence = sample_rate * min_silence_ms // 1000
+    pad = sample_rate * pad_ms // 1000
+    merged = []
+    for start, end in segments:
+        if merged and start - merged[-1][1] < min_silence + 2 * pad:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    return [(max(0, s - pad), min(n_samples, e + pad)) for s, e in merged]
+
+
+def trim_silence(wav: torch.Tensor, sample_rate: int = 16000, **kwargs) -> torch.Tensor:
+    """Drop leading and trailing silence. Fully silent input gives an empty tensor"""
+    segments = detect_speech(wav, sample_rate, **kwargs)
+    if not segments:
+        return wav[..., :0]
+    return wav[..., segments[0][0] : segments[-1][1]]
+
+
+def split_on_silence(
+    wav: torch.Tensor, max_samples: int, sample_rate: int = 16000, **kwargs
+) -> list[torch.Tensor]:
+    """Split audio into chunks of at most `max_samples`, cutting at pauses where possible"""
+    chunks = []
+    chunk = None
+    for start, end in detect_speech(wav, sample_rate, **kwargs):
+        if chunk is not None and end - chunk[0] <= max_samples:
+            chunk[1] = end
+            continue
+        if chunk is not None:
+            chunks.append(chunk)
+        # a single segment longer than the limit has no pause to cut at
+        while end - start > max_samples:
+            chunks.append([start, start + max_samples])
+            start += max_samples
+        chunk = [start, end]
+    if chunk is not None:
+        chunks.append(chunk)
+
+    return [wav[..., s:e] for s, e in chunks]
@@ -0,0 +1,53 @@
+import copy
+from types import SimpleNamespace
+
+import pytest
+import torch
+import whisper
+import yaml
+
+import ichigo.asr.transcriber as transcriber
+from ichigo.asr.arch.quantizer import Quantizer
+from ichigo.asr.config import CONFIG_DIR
+
+# a randomly initialized pipeline small enough to build in a test. The quantizer
+# width must match the Whisper widths, and 1500 audio frames are hardcoded
+DIMS = whisper.model.ModelDimensions(
+    n_mels=80,
+    n_audio_ctx=1500,
+    n_audio_state=64,
+    n_audio_head=4,
+    n_audio_layer=1,
+    n_vocab=51865,
+    n_text_ctx=448,
+    n_text_state=64,
+    n_text_head=4,
+    n_text_layer=1,
+)
+
+
+def random_whisper() -> whisper.model.Whisper:
+    model = whisper.model.Whisper(DIMS)
+    # left uninitialized by whisper, loaded from checkpoints
+    torch.nn.init.normal_(model.decoder.positional_embedding, std=0.02)
+    return model
+
+
+@pytest.fixture
+def tiny_config(monkeypatch):
+    """Make `IchigoASR()` build a small randomly initialized pipeline, offline"""
+    with open(CONFIG_DIR / "merge-2560d.yaml") as f:
+        config = yaml.safe_load(f)
+    config["whisper_name"] = "tiny-random"  # no alignment heads for these dims
+    config["quantizer"].update(n_head=4, head_width=16, codebook_dim=16)
+    config["r2t"]["decoding_options"].update(sample_len=8, prompt=None)
+
+    torch.manual_seed(0)
+    monkeypatch.setattr(
+        transcriber, "yaml", SimpleNamespace(safe_load=lambda f: copy.deepcopy(config))
+    )
+    monkeypatch.setattr(whisper, "load_model", lambda name, device: random_whisper())
+    monkeypatch.setattr(
+        transcriber, "load_quantizer", lambda ref, config: Quantizer(config).eval()
+    )
+    return config
@@ -0,0 +1,127 @@
+import io
+import json
+import threading
+import wave
+from contextlib import contextmanager
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import api.asr as api_asr
+
+
+class StubASR:
+    """Offline stand-in for IchigoASR"""
+
+    def preprocess(self, wav, sample_rate):
+        return wav
+
+    def infer(self, wav):
+        return "hello world"
+
+    def infer_stream(self, wav):
+        yield from ("hello", " world")
+
+
+class StubRegistry:
+    def __init__(self):
+        self.model = StubASR()
+
+    @contextmanager
+    def use(self, **kwargs):
+        yield self.model
+
+
+def wav_bytes(seconds: float = 0.5, sample_rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(b"\0\0" * int(sample_rate * seconds))
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(api_asr, "model_registry", StubRegistry())
+    # without the context manager the lifespan, which loads the real model, does not run
+    return TestClient(api_asr.app)
+
+
+def transcribe(client, data: bytes, **form):
+    return client.post(
+        "/v1/audio/transcriptions",
+        files={"file": ("a.wav", data, "audio/wav")},
+        data={"model": "ichigo", **form},
+    )
+
+
+def test_transcription(client):
+    response = transcribe(client, wav_bytes())
+    assert response.status_code == 200
+    assert response.json() == {"text": "hello world"}
+
+
+def test_rejects_undecodable_audio(client):
+    assert transcribe(client, b"not audio").status_code == 400
+
+
+def test_rejects_large_upload(client, monkeypatch):
+    monkeypatch.setattr(api_asr, "MAX_UPLOAD_BYTES", 100)
+    assert transcribe(client, wav_bytes()).status_code == 413
+
+
+def test_rejects_long_audio(client, monkeypatch):
+    monkeypatch.setattr(api_asr, "MAX_AUDIO_SECONDS", 0.1)
+    assert transcribe(client, wav_bytes(0.5)).status_code == 413
+
+
+def test_sheds_load_when_full(client, monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(api_asr, "PENDING_SLOTS", slots)
+    slots.acquire()
+    try:
+        response = transcribe(client, wav_bytes())
+    finally:
+        slots.release()
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert transcribe(client, wav_bytes()).status_code == 200
+
+
+def test_body_size_limit():
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    app.add_middleware(api_asr.BodySizeLimit, max_bytes=100)
+    client = TestClient(app)
+
+    assert client.post("/echo", content=b"x" * 100).json() == {"size": 100}
+    assert client.post("/echo", content=b"x" * 101).status_code == 413
+    # chunked, without Content-Length
+    chunks = iter([b"x" * 60, b"x" * 60])
+    assert client.post("/echo", content=chunks).status_code == 413
+
+
+def test_streamed_transcription(client):
+    response = transcribe(client, wav_bytes(), stream="true")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [
+        json.loads(line[len("data: ") :])
+        for line in response.text.splitlines()
+        if line.startswith("data: ")
+    ]
+    assert [e["type"] for e in events] == [
+        "transcript.text.delta",
+        "transcript.text.delta",
+        "transcript.text.done",
+    ]
+    assert "".join(e["delta"] for e in events[:-1]) == "hello world"
+    assert events[-1]["text"] == "hello world"
@@ -0,0 +1,85 @@
+import json
+
+import numpy as np
+import pytest
+
+from ichigo.asr.dataset import ShardedTokenReader, ShardedTokenWriter, shard_of
+
+
+def test_round_trip(tmp_path):
+    records = {f"clip_{i}.wav": np.arange(i + 1, dtype=np.int64) * 7 for i in range(20)}
+    with ShardedTokenWriter(tmp_path, num_shards=4) as writer:
+        for key, tokens in records.items():
+            writer.write(key, tokens)
+
+    reader = ShardedTokenReader(tmp_path)
+    assert len(reader) == len(records)
+    assert sorted(reader.keys) == sorted(records)
+    for key, tokens in reader:
+        np.testing.assert_array_equal(tokens, records[key])
+    assert reader.as_string(0).startswith("<|sound_start|>")
+
+
+def test_ranks_split_shards(tmp_path):
+    writers = [ShardedTokenWriter(tmp_path, 4, rank, world_size=2) for rank in range(2)]
+    for i in range(10):
+        key = f"k{i}"
+        writer = writers[shard_of(key, 4) % 2]
+        assert writer.owns(key)
+        writer.write(key, [i])
+        with pytest.raises(ValueError):
+            writers[1 - writers.index(writer)].write(key, [i])
+    for writer in writers:
+        writer.close()
+    assert len(ShardedTokenReader(tmp_path)) == 10
+
+
+def test_any_rank_creates_the_manifest(tmp_path):
+    with ShardedTokenWriter(tmp_path, 4, rank=1, world_size=2) as writer:
+        key = next(k for k in (f"k{i}" for i in range(100)) if writer.owns(k))
+        writer.write(key, [1, 2])
+    assert [p.name for p in tmp_path.glob("manifest*")] == ["manifest.json"]
+    assert ShardedTokenReader(tmp_path).get(key).tolist() == [1, 2]
+
+
+def test_recovers_from_partial_writes(tmp_path):
+    with ShardedTokenWriter(tmp_path, num_shards=1) as writer:
+        for i in range(3):
+            writer.write(f"k{i}", [i] * (i + 1))
+    # an interrupted writer flushed the index but only the first key
+    (tmp_path / "shard-00000.keys").write_text("k0\nk1")
+
+    with ShardedTokenWriter(tmp_path, num_shards=1) as writer:
+        writer.write("k3", [9, 9])
+
+    reader = ShardedTokenReader(tmp_path)
+    assert reader.keys == ["k0", "k3"]
+    assert reader.get("k0").tolist() == [0]
+    assert reader.get("k3").tolist() == [9, 9]
+
+
+def test_rejects_line_breaks_in_keys(tmp_path):
+    with ShardedTokenWriter(tmp_path, num_shards=1) as writer:
+        for key in ("a\nb.wav", "a\rb.wav", "a\u2028b.wav", "a\x85b.wav"):
+            with pytest.raises(ValueError):
+                writer.write(key, [1])
+        writer.write("c.wav", [2])
+    assert ShardedTokenReader(tmp_path).keys == ["c.wav"]
+
+
+def test_rejects_mismatched_settings(tmp_path):
+    ShardedTokenWriter(tmp_path, num_shards=2).close()
+    with pytest.raises(ValueError):
+        ShardedTokenWriter(tmp_path, num_shards=4)
+    with pytest.raises(ValueError):
+        ShardedTokenWriter(tmp_path, 2, metadata=dict(compressed=True, dur_base=512))
+
+
+def test_compressed_as_string(tmp_path):
+    metadata = dict(compressed=True, dur_base=512)
+    with ShardedTokenWriter(tmp_path, 1, metadata=metadata) as writer:
+        writer.write("k", [3, 512 + 5])
+    assert json.loads((tmp_path / "manifest.json").read_text())["dur_base"] == 512
+
+    reader = ShardedTokenReader(tmp_path)
+    assert reader.as_string(0) == "<|sound_start|><|sound_0003|><|sound_dur_5|><|sound_end|>"
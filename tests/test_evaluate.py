@@ -0,0 +1,62 @@
+import json
+
+from ichigo.asr.evaluate import (
+    error_rate,
+    evaluate,
+    load_manifest,
+    make_synthetic_manifest,
+    normalize_text,
+    percentile,
+    to_markdown,
+)
+
+
+class StubASR:
+    """Offline stand-in for IchigoASR that answers every clip with `text`"""
+
+    def __init__(self, text: str = "", **kwargs):
+        self.text = text
+
+    def preprocess(self, wav, sample_rate):
+        return wav
+
+    def infer(self, wav):
+        return self.text
+
+
+def test_normalize_and_error_rate():
+    assert normalize_text("  Hello,   World! ") == "hello world"
+    assert error_rate(["a b c d"], ["a x c"], "word") == 0.5
+    assert error_rate(["abcd"], ["abed"], "char") == 0.25
+    assert error_rate([""], ["anything"]) is None
+
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    assert percentile([3, 1, 2], 100) == 3
+
+
+def test_load_tsv_manifest(tmp_path):
+    (tmp_path / "test.tsv").write_text("a.wav\thello\nsub/b.wav\tworld\n", encoding="utf-8")
+    items = load_manifest(tmp_path / "test.tsv")
+    assert [i["text"] for i in items] == ["hello", "world"]
+    assert items[1]["audio"] == str(tmp_path / "sub" / "b.wav")
+
+
+def test_evaluate_synthetic_offline(tmp_path):
+    manifest = make_synthetic_manifest(tmp_path, n=3)
+    configs = [{"name": "silent"}, {"name": "noisy", "text": "hello"}]
+    results = evaluate(manifest, configs, num_workers=2, model_factory=StubASR)
+
+    assert [r["name"] for r in results] == ["silent", "noisy"]
+    assert all(r["n"] == 3 for r in results)
+    assert results[0]["hypotheses"] == ["", "", ""]
+    assert results[1]["hypotheses"] == ["hello"] * 3
+    # references are empty, so there is nothing to score
+    assert results[0]["wer"] is None
+    assert results[0]["rtf"] >= 0
+
+    table = to_markdown(results)
+    assert table.count("\n") == 3
+    json.dumps(results)
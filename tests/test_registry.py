@@ -0,0 +1,65 @@
+import sys
+
+import pytest
+
+from ichigo.asr.registry import ModelRegistry
+
+
+class FakeASR:
+    """Stands in for IchigoASR, with a footprint set by the `size` kwarg"""
+
+    loads = []
+
+    def __init__(self, size: int = 100, **kwargs):
+        self.size = size
+        self.kwargs = kwargs
+        FakeASR.loads.append(kwargs)
+
+    def memory_footprint(self) -> int:
+        return self.size
+
+
+@pytest.fixture(autouse=True)
+def fake_asr(monkeypatch):
+    FakeASR.loads = []
+    # patched on the module itself, so no real model is ever loaded
+    monkeypatch.setattr(sys.modules["ichigo.asr.registry"], "IchigoASR", FakeASR)
+
+
+def test_models_are_cached_per_kwargs():
+    registry = ModelRegistry()
+    a = registry.get(config="a", device="cpu")
+    assert registry.get(config="a", device="cpu") is a
+    assert registry.get(config="b", device="cpu") is not a
+    assert len(registry) == 2
+    assert len(FakeASR.loads) == 2
+
+
+def test_lru_eviction_over_budget():
+    registry = ModelRegistry(memory_budget=250)
+    registry.get(config="a", device="cpu")
+    registry.get(config="b", device="cpu")
+    registry.get(config="a", device="cpu")  # "b" becomes least recently used
+    registry.get(config="c", device="cpu")
+
+    assert len(registry) == 2
+    assert registry.resident_bytes() == 200
+    registry.get(config="a", device="cpu")
+    assert len(FakeASR.loads) == 3  # "a" was kept
+    registry.get(config="b", device="cpu")
+    assert len(FakeASR.loads) == 4  # "b" was evicted and reloaded
+
+
+def test_pinned_models_are_not_evicted():
+    registry = ModelRegistry(memory_budget=150)
+    with registry.use(config="a", device="cpu") as a:
+        registry.get(config="b", device="cpu")
+        assert registry.evict(config="a", device="cpu") is False
+        assert registry.get(config="a", device="cpu") is a
+    assert registry.evict(config="a", device="cpu") is True
+
+
+def test_warmup():
+    registry = ModelRegistry()
+    model = registry.warmup(config="a", device="cpu").result()
+    assert registry.get(config="a", device="cpu") is model
@@ -0,0 +1,35 @@
+import pytest
+import torch
+
+from ichigo.asr.snapshot import load_snapshot, save_snapshot
+from ichigo.asr.transcriber import IchigoASR
+
+
+def test_snapshot_round_trip(tiny_config, tmp_path):
+    model = IchigoASR(device="cpu", thread_profile=False)
+    model.warmup()
+    path = tmp_path / "snapshot.pt"
+    save_snapshot(model, path)
+
+    snapshot = load_snapshot(path)
+    assert snapshot["config_name"] == "merge-2560d"
+    assert isinstance(snapshot["torch_version"], str)
+
+    loaded = IchigoASR(snapshot=path, device="cpu", thread_profile=False)
+    for name in ("s2r", "quantizer", "r2t"):
+        expected = getattr(model, name).state_dict()
+        actual = getattr(loaded, name).state_dict()
+        assert expected.keys() == actual.keys()
+        for key in expected:
+            assert torch.equal(expected[key], actual[key]), key
+    assert not any(t.is_meta for t in loaded.quantizer.buffers())
+
+    wav = 0.1 * torch.randn(1, 16000)
+    assert loaded.infer(wav) == model.infer(wav)
+    assert torch.equal(loaded.encode_stoks(wav), model.encode_stoks(wav))
+
+
+def test_rejects_other_files(tmp_path):
+    torch.save(dict(format="something-else"), tmp_path / "other.pt")
+    with pytest.raises(ValueError):
+        load_snapshot(tmp_path / "other.pt")
@@ -0,0 +1,47 @@
+import pytest
+
+from ichigo.asr.tokens import (
+    compression_report,
+    rle_compress,
+    rle_expand,
+    stoks_to_str,
+    str_to_stoks,
+)
+
+DUR_BASE = 512
+
+
+def test_rle_round_trip():
+    tokens = [5, 5, 5, 5, 7, 8, 8, 9, 9, 9] + [3] * 40
+    compressed = rle_compress(tokens, DUR_BASE, max_run=16)
+    assert compressed[:4] == [5, DUR_BASE + 4, 7, 8]
+    assert len(compressed) < len(tokens)
+    assert rle_expand(compressed, DUR_BASE) == tokens
+
+
+def test_rle_keeps_short_runs_and_splits_long_ones():
+    assert rle_compress([1, 1, 2], DUR_BASE) == [1, 1, 2]
+    assert rle_compress([4] * 20, DUR_BASE, max_run=16) == [4, DUR_BASE + 16, 4, DUR_BASE + 4]
+
+
+def test_rle_rejects_colliding_tokens():
+    with pytest.raises(ValueError):
+        rle_compress([DUR_BASE], DUR_BASE)
+    with pytest.raises(ValueError):
+        rle_expand([DUR_BASE + 3], DUR_BASE)
+
+
+def test_string_round_trip_with_durations():
+    compressed = rle_compress([0, 0, 0, 0, 0, 12], DUR_BASE)
+    text = stoks_to_str(compressed, DUR_BASE)
+    assert text == "<|sound_start|><|sound_0000|><|sound_dur_5|><|sound_0012|><|sound_end|>"
+    assert str_to_stoks(text, DUR_BASE) == compressed
+    with pytest.raises(ValueError):
+        str_to_stoks(text)
+
+
+def test_compression_report():
+    report = compression_report([("a", [1] * 8), [2, 3]], DUR_BASE)
+    assert report["sequences"] == 2
+    assert report["tokens"] == 10
+    assert report["compressed_tokens"] == 4
@@ -0,0 +1,28 @@
+import torch
+
+from ichigo.asr.tokens import rle_expand
+from ichigo.asr.transcriber import IchigoASR
+
+
+def test_stream_matches_infer(tiny_config):
+    model = IchigoASR(device="cpu", thread_profile=False)
+    wav = 0.1 * torch.randn(1, 16000)
+    deltas = list(model.infer_stream(wav))
+    assert "".join(deltas) == model.infer(wav)
+
+
+def test_stream_of_silence_is_empty(tiny_config):
+    model = IchigoASR(device="cpu", thread_profile=False, vad=True)
+    wav = model.preprocess(torch.zeros(1, 16000), 16000)
+    assert list(model.infer_stream(wav)) == []
+
+
+def test_compressed_stoks_round_trip(tiny_config):
+    model = IchigoASR(device="cpu", thread_profile=False)
+    wav = 0.1 * torch.randn(1, 16000)
+    stoks = model.encode_stoks(wav)
+    compressed = model.encode_stoks(wav, compress=True)
+
+    dur_base = model.quantizer.codebook_size
+    assert rle_expand(compressed.squeeze(0).tolist(), dur_base) == stoks.squeeze(0).tolist()
+    assert model.decode_stoks(compressed) == model.decode_stoks(stoks)
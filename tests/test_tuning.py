@@ -0,0 +1,68 @@
+import json
+import threading
+import time
+
+import pytest
+import torch
+
+from ichigo.asr.tuning import (
+    PROFILE_VERSION,
+    _pick,
+    check_profile,
+    load_profile,
+    machine_signature,
+    num_threads,
+    stage_threads,
+)
+
+
+def profile(**threads) -> dict:
+    return dict(version=PROFILE_VERSION, machine=machine_signature(), threads=threads)
+
+
+def test_pick_prefers_fewer_threads():
+    assert _pick({1: 1.0, 2: 0.52, 4: 0.5, 8: 0.51}) == 2
+    assert _pick({1: 1.0, 2: 0.9}, tolerance=0.0) == 2
+
+
+def test_load_profile(tmp_path):
+    path = tmp_path / "profile.json"
+    assert load_profile(path) is None
+    path.write_text(json.dumps(profile(s2r=2)))
+    assert load_profile(path)["threads"] == {"s2r": 2}
+
+    with pytest.warns(UserWarning):
+        assert check_profile(dict(profile(), machine=dict(cpu_count=-1))) is None
+    with pytest.warns(UserWarning):
+        assert check_profile(dict(profile(), version=-1)) is None
+
+
+def test_stage_threads_sets_and_restores():
+    before = torch.get_num_threads()
+    with stage_threads(profile(s2r=1), "s2r"):
+        assert torch.get_num_threads() == 1
+    assert torch.get_num_threads() == before
+
+    with stage_threads(None, "s2r"), stage_threads(profile(s2r=1), "r2t"):
+        assert torch.get_num_threads() == before
+
+
+def test_concurrent_stages_keep_their_budget():
+    before = torch.get_num_threads()
+    errors = []
+
+    def run(n):
+        for _ in range(50):
+            with num_threads(n):
+                time.sleep(0.001)  # let the other threads run
+                if torch.get_num_threads() != n:
+                    errors.append(n)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in (1, 2, 3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert torch.get_num_threads() == before
@@ -0,0 +1,48 @@
+import torch
+
+from ichigo.asr.vad import detect_speech, split_on_silence, trim_silence
+
+SR = 16000
+
+
+def tone(seconds: float) -> torch.Tensor:
+    t = torch.arange(int(SR * seconds)) / SR
+    return 0.5 * torch.sin(2 * torch.pi * 220 * t)
+
+
+def silence(seconds: float) -> torch.Tensor:
+    return torch.zeros(int(SR * seconds))
+
+
+def test_detect_speech_finds_segments():
+    wav = torch.cat([silence(1), tone(1), silence(1), tone(0.5), silence(0.5)]).unsqueeze(0)
+    segments = detect_speech(wav, SR, pad_ms=0)
+    assert len(segments) == 2
+    (s1, e1), (s2, e2) = segments
+    assert abs(s1 - SR) <= 480 and abs(e1 - 2 * SR) <= 480
+    assert abs(s2 - 3 * SR) <= 480 and abs(e2 - 3.5 * SR) <= 480
+
+
+def test_short_pauses_are_merged():
+    wav = torch.cat([tone(1), silence(0.1), tone(1)])
+    assert len(detect_speech(wav, SR, min_silence_ms=300)) == 1
+
+
+def test_trim_silence():
+    wav = torch.cat([silence(1), tone(1), silence(1)]).unsqueeze(0)
+    trimmed = trim_silence(wav, SR, pad_ms=0)
+    assert abs(trimmed.shape[-1] - SR) <= 960
+    assert trim_silence(silence(1).unsqueeze(0), SR).shape == (1, 0)
+
+
+def test_split_on_silence_cuts_at_pauses():
+    wav = torch.cat([tone(2), silence(1), tone(2), silence(1), tone(2)]).unsqueeze(0)
+    chunks = split_on_silence(wav, max_samples=5 * SR, sample_rate=SR)
+    assert len(chunks) == 3
+    assert all(c.shape[-1] <= 5 * SR for c in chunks)
+
+
+def test_split_on_silence_cuts_long_speech():
+    wav = tone(12).unsqueeze(0)
+    chunks = split_on_silence(wav, max_samples=5 * SR, sample_rate=SR)
+    assert [c.shape[-1] for c in chunks] == [5 * SR, 5 * SR, 2 * SR]
@@ -0,0 +1,36 @@
+import torch
+
+from ichigo.asr.arch import Workspace
+from ichigo.asr.transcriber import IchigoASR
+
+
+def test_buffers_are_reused_and_grow():
+    ws = Workspace("cpu", pin_memory=False)
+    a = ws.get("x", (3, 5))
+    assert a.shape == (3, 5)
+    assert ws.nbytes() == 16 * 4  # rounded up to a power of two elements
+
+    b = ws.get("x", (4, 4))
+    assert b.data_ptr() == a.data_ptr()
+    assert ws.get("x", (2, 20)).numel() == 40
+    assert ws.nbytes() == 64 * 4
+
+    assert ws.get("x", (2,), torch.long).dtype == torch.long  # separate buffer
+    ws.clear()
+    assert ws.nbytes() == 0
+
+
+def test_workspace_matches_allocating_path(tiny_config):
+    model = IchigoASR(device="cpu", thread_profile=False)
+    assert model.workspace is not None
+    assert torch.is_grad_enabled()  # the out= ops must not see grad mode
+
+    wav = 0.1 * torch.randn(1, 16000)
+    stoks = model.encode_stoks(wav)
+    with_workspace = model.quantizer.dequantize(stoks).clone()
+    text = model.infer(wav)
+
+    model.quantizer.workspace = model.s2r.workspace = None
+    assert torch.allclose(model.quantizer.dequantize(stoks), with_workspace, atol=1e-5)
+    assert torch.equal(model.encode_stoks(wav), stoks)
+    assert model.infer(wav) == text